@@ -1,5 +1,72 @@
-import itertools, graphics
-import MazeGenerator
+import os, itertools, array, zlib, tempfile, heapq, atexit
+import MazeGenerator, MazeText, MazeBinary, MazeGrid, MazeSolver,\
+    MazeJunctions, MazeHierarchy
+
+# The graphics module opens a Tk root window as soon as it is imported,
+# so it is not imported until something is actually drawn.
+graphics = None
+
+def _loadGraphics():
+    """
+    Import the graphics module, if it has not been imported already.
+    """
+    global graphics
+    if graphics is None:
+        import graphics
+
+class _SparseCounts(dict):
+    """
+    Visit counts for a paged maze, keyed on flat cell index.  Cells
+    that were never visited are not stored, and count as 0.
+    """
+    def __missing__(self, index):
+        return 0
+
+class _SharedFile:
+    """
+    A shared memory file created by Maze.share.  The file is removed
+    when the last reference to this object goes (normally when the
+    maze that shared it is dropped), or when the program exits,
+    whichever comes first.  Only the process that created the file
+    removes it, so that processes forked from it (such as the workers
+    of a multiprocessing Pool) leave it alone.
+    """
+    # The files that have not been removed yet, and the process that
+    # created each of them
+    _live = {}
+
+    def __init__(self, filename):
+        self.filename = filename
+        _SharedFile._live[filename] = os.getpid()
+
+    def remove(self):
+        """
+        Remove the file, if it has not been removed already.
+        """
+        _removeSharedFile(self.filename)
+
+    def __del__(self):
+        self.remove()
+
+def _removeSharedFile(filename):
+    """
+    Remove a file created by Maze.share, if it has not been removed
+    already and this is the process that created it.
+    """
+    if _SharedFile._live.get(filename) == os.getpid():
+        del _SharedFile._live[filename]
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+@atexit.register
+def _removeSharedFiles():
+    """
+    Remove the files of every maze still shared when the program exits.
+    """
+    for filename in list(_SharedFile._live):
+        _removeSharedFile(filename)
 
 class Maze:
     _directions = ['N', 'E', 'S', 'W']
@@ -14,18 +81,27 @@ class Maze:
     _start_color_graphics = 'green'
     _end_color_graphics = 'blue'
 
+    # Edits that change the distances of more cells than this, and more
+    # than a sixteenth of the maze, recompute the distance field from
+    # scratch rather than repair it (see setWall)
+    _repair_minimum = 1024
+
     def __init__(self):
         """
         Create a new, empty maze.
         """
         self._win = None
         self._player_graphics = None
+        self._shared = None
+        self._revision = 0
+        self._grid = None
 
         self.clear()
         self._breadcrumbs = []
 
         self.setDraw(True)
         self._generator = MazeGenerator.MazeGenerator()
+        self._cache = None
         self._trail = False
         self._congrats_graphics = None
 
@@ -33,7 +109,14 @@ class Maze:
         """
         Return the maze to its initial (empty) state.
         """
+        self.unshare()
+        if self._grid:
+            self._grid.closeFile()
         self._grid = None
+        self._changed()
+        self._filename = None
+        self._visits = None
+        self._sparse_visits = False
         self._start = None
         self._finish = None
         self._position = (0, 0)
@@ -56,19 +139,57 @@ class Maze:
         """
         self._show = s
 
-    def load(self, filename):
+    def load(self, filename, paged = False):
         """
-        Load a maze from a text file.
+        Load a maze from a text file, or from a file written by save
+        with binary=True.  Binary files are memory mapped rather than
+        read, so even very large mazes open almost immediately.
 
         Args:
         filename (string): The name of the text file containing a
                            description of the maze.
+        paged (boolean) (optional): If paged is True, the maze (which
+                                    must be in the binary format) is
+                                    read in tiles only as the player
+                                    reaches them, and only the most
+                                    recently used tiles are kept in
+                                    memory.  Visit counts are then
+                                    kept just for the cells visited.
+                                    Use this with setDraw(False) for
+                                    mazes larger than memory.
         """
+        if MazeBinary.isBinary(filename):
+            self.clear()
+            if paged:
+                self._grid, self._start, self._finish =\
+                    MazeBinary.loadPaged(filename)
+                self._sparse_visits = True
+            else:
+                self._grid, self._start, self._finish =\
+                    MazeBinary.load(filename)
+            self._clearBreadcrumbs()
+            self._position = self._start
+            self._loaded(filename)
+            self.draw()
+            return
+        if paged:
+            raise ValueError("only mazes in the binary format can be paged")
         f = open(filename)
         if not f:
             print "Cannot find" + filename
         self._load(f)
         f.close()
+        if self._grid:
+            self._loaded(filename)
+
+    def _loaded(self, filename):
+        """
+        Remember the file from which the maze was loaded, so that
+        indexes saved next to it can be used while the maze is
+        unchanged.
+        """
+        self._filename = filename
+        self._file_revision = self._revision
 
     def _load(self, f):
         """
@@ -79,24 +200,18 @@ class Maze:
                          maze.
         """
         self.clear()
-        self._grid = []
-        for row_no, line in enumerate(f):
-            self._grid.append([])
-            cells = line.split()
-            for col_no, c in enumerate(cells):
-                self._grid[-1].append(c)
-                if '^' in c:
-                    self._start = (row_no, col_no)
-                if '$' in c:
-                    self._finish = (row_no, col_no)
-
-        # check to make sure that all lines are the same length
-        length = len(self._grid[0])
-        for row in self._grid[1:]:
-            if len(row) != length:
-               print "Error: all rows must be the same length" 
-               self.clear()
-               return
+        try:
+            self._grid, self._start, self._finish, visited =\
+                MazeText.read(f)
+        except ValueError as e:
+            print "Error: " + str(e)
+            self.clear()
+            return
+        self._clearBreadcrumbs()
+        if visited:
+            visits = self._visitCounts()
+            for index in visited:
+                visits[index] += 1
 
         # check to make sure that a start and finish point are defined
         if not self._start:
@@ -117,11 +232,12 @@ class Maze:
         """
         if self._show:
             if self._grid:
+                _loadGraphics()
                 # Size of screen
                 height = (self._cell_height + self._cell_sep) *\
-                    len(self._grid) + self._cell_sep
+                    self._grid.height + self._cell_sep
                 width = (self._cell_width + self._cell_sep) *\
-                    len(self._grid[0]) + self._cell_sep
+                    self._grid.width + self._cell_sep
                 if self._win != None and\
                         (self._win.getWidth(), self._win.getHeight()) !=\
                         (width, height):
@@ -129,8 +245,9 @@ class Maze:
                     self._win = None
                 if self._win == None:
                     self._win = graphics.GraphWin("Maze", width, height)
-                for row_no, line in enumerate(self._grid):
-                    for col_no, c in enumerate(line):
+                for row_no in range(self._grid.height):
+                    for col_no in range(self._grid.width):
+                        c = self._grid.get(row_no, col_no)
                         x_coord = col_no * (self._cell_width +\
                                                 self._cell_sep)
                         y_coord = row_no * (self._cell_height +\
@@ -150,19 +267,19 @@ class Maze:
                         bottom_right_corner = graphics.Point(right, bottom)
 
                         # Draw the walls
-                        if 'N' not in c:
+                        if not c & self._grid.N:
                             line = graphics.Line(top_left_corner,
                                                  top_right_corner)
                             line.draw(self._win)
-                        if 'E' not in c:
+                        if not c & self._grid.E:
                             line = graphics.Line(top_right_corner,
                                                  bottom_right_corner)
                             line.draw(self._win)
-                        if 'S' not in c:
+                        if not c & self._grid.S:
                             line = graphics.Line(bottom_left_corner,
                                                  bottom_right_corner)
                             line.draw(self._win)
-                        if 'W' not in c:
+                        if not c & self._grid.W:
                             line = graphics.Line(top_left_corner,
                                                  bottom_left_corner)
                             line.draw(self._win)
@@ -275,8 +392,8 @@ class Maze:
         elif self._orientation == 'W':
             pos = self._position[0], self._position[1] - 1
         # Make sure that the player doesn't move off the edge of the map
-        pos = min(max(pos[0], 0), len(self._grid) - 1),\
-            min(max(pos[1], 0), len(self._grid[0]) - 1)
+        pos = min(max(pos[0], 0), self._grid.height - 1),\
+            min(max(pos[1], 0), self._grid.width - 1)
         return pos
 
     def moveForward(self):
@@ -293,7 +410,8 @@ class Maze:
             old_pos = self._position
             self._placeBreadcrumb(old_pos)
             next_cell = self._getNext()
-            if self._orientation in self._grid[old_pos[0]][old_pos[1]] and\
+            if self._grid.isOpen(old_pos[0], old_pos[1],
+                                 self._orientation) and\
                     next_cell != self._position:
                 self._position = next_cell
                 moved = True
@@ -319,8 +437,9 @@ class Maze:
         """
         if self._grid:
             next_cell = self._getNext()
-            cell = self._grid[self._position[0]][self._position[1]]
-            return self._orientation in cell and next_cell != cell
+            return self._grid.isOpen(self._position[0], self._position[1],
+                                     self._orientation) and\
+                                     next_cell != self._position
 
     def wasVisited(self):
         """
@@ -328,7 +447,377 @@ class Maze:
         which he/she is currently located, False otherwise.
         """
         if self._grid:
-            return '*' in self._grid[self._position[0]][self._position[1]]
+            return self._visits is not None and\
+                self._visits[self._grid.index(*self._position)] != 0
+
+    def getVisitCount(self):
+        """
+        Returns the number of times the player has moved out of (or
+        tried to move out of) the cell in which he/she is currently
+        located.
+        """
+        if self._grid:
+            return self._visitCounts()[self._grid.index(*self._position)]
+
+    def getVisitCounts(self):
+        """
+        Returns the visit counts for every cell in the maze, as a flat
+        array in row-major order.  The count for cell (row, column) is
+        at index row * width + column.  The array is shared with the
+        maze, so it reflects later moves.  For a maze loaded with
+        paged=True, a dictionary holding only the visited cells is
+        returned instead; looking up any other cell gives 0.
+        """
+        if self._grid:
+            return self._visitCounts()
+
+    def getSolver(self):
+        """
+        Returns a MazeSolver for the maze.  The solver is created the
+        first time it is needed, and kept until the maze changes.
+        """
+        if self._grid:
+            return self._index('solver',
+                               lambda: MazeSolver.MazeSolver(self._grid))
+
+    def getDistances(self):
+        """
+        Returns the number of steps on the shortest path from every
+        cell to the end point, as a read-only NumPy array indexed by
+        flat cell index (row * width + column).  Cells from which the
+        end point cannot be reached have -1.  The array is computed
+        the first time it is needed, and kept until the maze changes.
+        """
+        if self._grid:
+            def build():
+                distances = self.getSolver().distances(
+                    self._grid.index(*self._finish))
+                distances.flags.writeable = False
+                return distances
+            return self._index('distances', build)
+
+    def getStepsRemaining(self):
+        """
+        Returns the number of steps on the shortest path from the
+        player's position to the end point, or -1 if it cannot be
+        reached.
+        """
+        if self._grid:
+            return int(self.getDistances()[
+                    self._grid.index(*self._position)])
+
+    def getJunctions(self):
+        """
+        Returns a MazeJunctions.JunctionGraph for the maze, in which
+        each corridor is a single edge.  The graph is built the first
+        time it is needed, and kept until the maze changes.
+        """
+        if self._grid:
+            return self._index('junctions',
+                               lambda: MazeJunctions.JunctionGraph(self._grid))
+
+    def nextJunction(self):
+        """
+        Find where the player would stop by moving forward along the
+        corridor ahead until reaching a junction or a dead end.  The
+        player does not move.
+
+        Returns:
+        A ((row, column), steps) tuple, or None if there is a wall in
+        front of the player.
+        """
+        if self._grid:
+            result = self.getJunctions().nextJunction(
+                self._grid.index(*self._position),
+                self._directions.index(self._orientation))
+            if result:
+                cell, steps = result
+                return self._grid.position(cell), steps
+
+    def getHierarchy(self, cluster_size = 32):
+        """
+        Returns a MazeHierarchy.HierarchicalPathfinder for the maze.
+
+        Building one means searching every cluster of the maze, so for
+        a maze loaded from a file it is saved next to the file (with
+        the extension .hpa added) and loaded from there the next time,
+        as long as the file and the maze have not changed.  It is also
+        kept until the maze changes.
+
+        Args:
+        cluster_size (int) (optional): The width and height of a
+                                       cluster (number of cells).
+        """
+        if self._grid:
+            def build():
+                unchanged = self._filename and\
+                    self._file_revision == self._revision
+                if unchanged:
+                    cache_file = self._filename + '.hpa'
+                    hierarchy = MazeHierarchy.load(cache_file, self._grid,
+                                                   self._filename)
+                    if hierarchy and hierarchy.cluster_size == cluster_size:
+                        return hierarchy
+                hierarchy = MazeHierarchy.HierarchicalPathfinder(
+                    self._grid, cluster_size)
+                if unchanged:
+                    try:
+                        hierarchy.save(cache_file, self._filename)
+                    except IOError:
+                        # The cache is only an optimization, so a
+                        # directory that cannot be written is not an
+                        # error
+                        pass
+                return hierarchy
+            return self._index(('hierarchy', cluster_size), build)
+
+    def hint(self):
+        """
+        Returns the direction ('N', 'E', 'S' or 'W') of the first step
+        on a shortest path from the player's position to the end
+        point, or None if the player is already there or it cannot be
+        reached.  Only the start of the path is worked out (see
+        getHierarchy), so this is quick even in very large mazes.
+        """
+        if self._grid:
+            position = self._grid.index(*self._position)
+            revision, distances = self._indexes.get('distances',
+                                                    (None, None))
+            if revision == self._revision:
+                # The distance field is already at hand (as it is
+                # while walls are being edited), so just step downhill
+                cell = None
+                if distances[position] > 0:
+                    for neighbor in self._openNeighbors(position):
+                        if distances[neighbor] == distances[position] - 1:
+                            cell = neighbor
+                            break
+            else:
+                cell = self.getHierarchy().firstStep(
+                    position, self._grid.index(*self._finish))
+            if cell is not None:
+                row, col = self._grid.position(cell)
+                offset = (row - self._position[0], col - self._position[1])
+                for direction, step in MazeGrid.MazeGrid.offsets.items():
+                    if step == offset:
+                        return direction
+
+    def solve(self, method = 'bfs'):
+        """
+        Find a shortest path from the player's position to the end
+        point.
+
+        Args:
+        method (string) (optional): The search to use: 'bfs',
+                                    'bidirectional' or 'astar'.
+
+        Returns:
+        An array of the flat indices (row * width + column) of the
+        cells along the path, starting with the player's position, or
+        None if the end point cannot be reached.
+        """
+        if self._grid:
+            if method not in ('bfs', 'bidirectional', 'astar'):
+                raise ValueError("unknown search method: " + str(method))
+            return getattr(self.getSolver(), method)(
+                self._grid.index(*self._position),
+                self._grid.index(*self._finish))
+
+    def setWall(self, row, col, direction, closed):
+        """
+        Open or close the wall on one side of a cell.  The neighboring
+        cell on the other side of the wall is updated to match.
+
+        If the distance field (see getDistances) has been computed, it
+        is repaired rather than thrown away: only the cells whose
+        distance to the end point actually changes are visited, so an
+        edit costs time in proportion to the part of the maze it
+        affects, not to the size of the maze.  The array returned by
+        getDistances is updated in place.  The other indexes (the
+        solver, the junction graph and the hierarchy) are built again
+        the next time they are needed.
+
+        Args:
+        row (int): The row of the cell.
+        col (int): The column of the cell.
+        direction (string): The side of the cell: 'N', 'E', 'S' or 'W'.
+        closed (bool): True to close the wall, False to open it.
+
+        Raises:
+        ValueError: If the direction is unknown, or the wall is on the
+                    edge of the maze.
+        """
+        if not self._grid:
+            return
+        if direction not in MazeGrid.MazeGrid.offsets:
+            raise ValueError("unknown direction: " + str(direction))
+        d_row, d_col = MazeGrid.MazeGrid.offsets[direction]
+        if not (0 <= row + d_row < self._grid.height and
+                0 <= col + d_col < self._grid.width):
+            raise ValueError("the wall on the " + direction +
+                             " side of cell " + str((row, col)) +
+                             " is on the edge of the maze")
+        if self._grid.isOpen(row, col, direction) != closed:
+            return
+
+        if closed:
+            self._grid.close(row, col, direction)
+        else:
+            self._grid.carve(row, col, direction)
+        cell = self._grid.index(row, col)
+        neighbor = self._grid.index(row + d_row, col + d_col)
+        # The cells no longer match the text they were loaded from
+        self._grid.spelling.pop(cell, None)
+        self._grid.spelling.pop(neighbor, None)
+        # Nor the shared memory file; copies of the maze that already
+        # map it keep working after it is removed
+        self.unshare()
+
+        revision, distances = self._indexes.get('distances', (None, None))
+        self._changed()
+        if revision == self._revision - 1:
+            distances.flags.writeable = True
+            limit = max(len(self._grid) // 16, self._repair_minimum)
+            if closed:
+                repaired = self._repairClosed(distances, cell, neighbor,
+                                              limit)
+            else:
+                repaired = self._repairOpened(distances, cell, neighbor,
+                                              limit)
+            if not repaired:
+                # So much of the maze changed that it is quicker to
+                # start again
+                distances[:] = self.getSolver().distances(
+                    self._grid.index(*self._finish))
+            distances.flags.writeable = False
+            self._indexes['distances'] = (self._revision, distances)
+        self.draw()
+
+    def toggleWall(self, row, col, direction):
+        """
+        Open the wall on one side of a cell if it is closed, or close
+        it if it is open (see setWall).
+
+        Returns:
+        True if the wall is now closed, False if it is now open.
+
+        Raises:
+        ValueError: If the direction is unknown, or the wall is on the
+                    edge of the maze.
+        """
+        if self._grid:
+            if direction not in MazeGrid.MazeGrid.offsets:
+                raise ValueError("unknown direction: " + str(direction))
+            closed = self._grid.isOpen(row, col, direction)
+            self.setWall(row, col, direction, closed)
+            return closed
+
+    def _openNeighbors(self, cell):
+        """
+        Returns the flat indices of the cells that can be reached in
+        one step from a cell.  As in MazeSolver, a side counts only if
+        it is inside the maze and open on both of its cells.
+        """
+        grid = self._grid
+        row, col = grid.position(cell)
+        flags = grid.get(row, col)
+        neighbors = []
+        for direction in MazeGrid.MazeGrid.directions:
+            if not flags & MazeGrid.MazeGrid.bits[direction]:
+                continue
+            d_row, d_col = MazeGrid.MazeGrid.offsets[direction]
+            if 0 <= row + d_row < grid.height and\
+                    0 <= col + d_col < grid.width and\
+                    grid.isOpen(row + d_row, col + d_col,
+                                MazeGrid.MazeGrid.opposite_dir[direction]):
+                neighbors.append(grid.index(row + d_row, col + d_col))
+        return neighbors
+
+    def _repairOpened(self, distances, a, b, limit):
+        """
+        Bring the distance field up to date after the wall between
+        cells a and b has been opened.  Distances can only get
+        shorter, and only for cells that now reach the end point more
+        quickly through the new passage; those are found by a
+        breadth-first search from whichever of the two cells gained.
+
+        Returns False, leaving the field partly repaired, if more than
+        limit cells change.
+        """
+        for u, v in ((a, b), (b, a)):
+            d = distances[u]
+            if d < 0 or 0 <= distances[v] <= d + 1:
+                continue
+            distances[v] = d + 1
+            queue = [ v ]
+            for cell in queue:
+                d = distances[cell] + 1
+                for neighbor in self._openNeighbors(cell):
+                    if distances[neighbor] < 0 or d < distances[neighbor]:
+                        distances[neighbor] = d
+                        queue.append(neighbor)
+                if len(queue) > limit:
+                    return False
+        return True
+
+    def _repairClosed(self, distances, a, b, limit):
+        """
+        Bring the distance field up to date after the wall between
+        cells a and b has been closed.
+
+        If the shortest path from one of the cells went through the
+        wall, that cell, and every cell whose shortest paths all went
+        through it, may now be further away.  Those cells are found by
+        working outward in order of distance, dropping any cell that
+        still has a neighbor one step closer outside the affected
+        region.  Their distances are then worked out again, with a
+        search that starts from the cells around the region and stays
+        inside it.
+
+        Returns False, without changing the field, if more than limit
+        cells are affected.
+        """
+        finish = self._grid.index(*self._finish)
+        affected = set()
+        heap = []
+        for u, v in ((a, b), (b, a)):
+            if distances[u] >= 0 and distances[v] == distances[u] + 1:
+                heap.append((int(distances[v]), v))
+        while heap:
+            d, cell = heapq.heappop(heap)
+            if cell in affected or cell == finish:
+                continue
+            neighbors = self._openNeighbors(cell)
+            if any(distances[neighbor] == d - 1 and neighbor not in affected
+                   for neighbor in neighbors):
+                continue
+            affected.add(cell)
+            if len(affected) > limit:
+                return False
+            for neighbor in neighbors:
+                if distances[neighbor] == d + 1:
+                    heapq.heappush(heap, (d + 1, neighbor))
+
+        for cell in affected:
+            distances[cell] = -1
+        heap = []
+        for cell in affected:
+            reached = [ distances[neighbor] for neighbor in
+                        self._openNeighbors(cell)
+                        if neighbor not in affected and
+                        distances[neighbor] >= 0 ]
+            if reached:
+                heap.append((int(min(reached)) + 1, cell))
+        heapq.heapify(heap)
+        while heap:
+            d, cell = heapq.heappop(heap)
+            if distances[cell] >= 0:
+                continue
+            distances[cell] = d
+            for neighbor in self._openNeighbors(cell):
+                if neighbor in affected and distances[neighbor] < 0:
+                    heapq.heappush(heap, (d + 1, neighbor))
+        return True
 
     def _checkFinished(self):
         """
@@ -338,9 +827,9 @@ class Maze:
         if self.isFinished():
             if not self._congrats_graphics:
                 height = (self._cell_height + self._cell_sep) *\
-                    len(self._grid) + self._cell_sep
+                    self._grid.height + self._cell_sep
                 width = (self._cell_width + self._cell_sep) *\
-                    len(self._grid[0]) + self._cell_sep
+                    self._grid.width + self._cell_sep
                 congrats_x = width // 2
                 congrats_y = height // 2
                 self._congrats_graphics = graphics.Text(
@@ -360,10 +849,7 @@ class Maze:
         Args:
         length (int): The length (number of cells) of the maze.
         """
-        self.clear()
-        self._grid, self._start, self._finish = self._generator.line(length)
-        self._position = self._start
-        self.draw()
+        self._generate('line', length)
 
     def spiral(self, width, height):
         """
@@ -373,11 +859,7 @@ class Maze:
         width (int): The width of the maze (number of cells).
         height (int): The height of the maze (number of cells).
         """
-        self.clear()
-        self._grid, self._start, self._finish =\
-            self._generator.spiral(width, height)
-        self._position = self._start
-        self.draw()
+        self._generate('spiral', width, height)
 
     def random(self, width, height, seed = None):
         """
@@ -389,18 +871,191 @@ class Maze:
         seed (int) (optional): The seed for the random number
         generator.  If not specified, defaults to time.time().
         """
+        self._generate('random', width, height, seed)
+
+    def binaryTree(self, width, height, seed = None):
+        """
+        Create a random maze with given dimensions, using the
+        Binary-Tree algorithm.  Requires NumPy.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        self._generate('binaryTree', width, height, seed)
+
+    def sidewinder(self, width, height, seed = None):
+        """
+        Create a random maze with given dimensions, using the
+        Sidewinder algorithm.  Requires NumPy.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        self._generate('sidewinder', width, height, seed)
+
+    def eller(self, width, height, seed = None):
+        """
+        Create a random maze with given dimensions, using Eller's
+        algorithm.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        self._generate('eller', width, height, seed)
+
+    def wilson(self, width, height, seed = None):
+        """
+        Create a random maze with given dimensions, using Wilson's
+        algorithm.  Every possible maze of that size is equally
+        likely.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        self._generate('wilson', width, height, seed)
+
+    def kruskal(self, width, height, seed = None):
+        """
+        Create a random maze with given dimensions, using Kruskal's
+        algorithm.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        self._generate('kruskal', width, height, seed)
+
+    def division(self, width, height, seed = None):
+        """
+        Create a random maze with given dimensions, by recursive
+        division.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        self._generate('division', width, height, seed)
+
+    def tiled(self, width, height, seed = None, tile_size = 512,
+              processes = None):
+        """
+        Create a random maze with given dimensions, generating tiles
+        of it in parallel in a pool of worker processes.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        tile_size (int) (optional): The width and height of each tile
+                                    (number of cells).
+        processes (int) (optional): The number of worker processes.
+                                    Defaults to the number of CPUs.
+        """
+        self._generate('tiled', width, height, seed, tile_size,
+                       processes=processes)
+
+    def setCache(self, cache):
+        """
+        Sets the cache used to look up generated mazes, so that a maze
+        with the same algorithm, dimensions and seed is only generated
+        once.
+
+        Args:
+        cache (MazeCache): The cache to use, or None to always
+                           generate mazes from scratch.
+        """
+        self._cache = cache
+
+    def _generate(self, algorithm, *args, **options):
+        """
+        Replace the maze with one from the generator.
+
+        Args:
+        algorithm (string): The name of the MazeGenerator method that
+                            creates the maze.
+        args: The arguments for that method.
+        options: Keyword arguments for that method that do not change
+                 the maze it makes (see MazeCache.generate).
+        """
         self.clear()
-        self._grid, self._start, self._finish =\
-            self._generator.random(width, height, seed)
+        if self._cache is not None:
+            self._grid, self._start, self._finish =\
+                self._cache.generate(self._generator, algorithm, *args,
+                                     **options)
+        else:
+            self._grid, self._start, self._finish =\
+                getattr(self._generator, algorithm)(*args, **options)
+        self._clearBreadcrumbs()
         self._position = self._start
         self.draw()
 
+    def _changed(self):
+        """
+        Record that the cells of the maze have changed, so that the
+        indexes built from them (see _index) are built again.
+        """
+        self._revision += 1
+        self._indexes = {}
+
+    def _index(self, name, build):
+        """
+        Returns an index of the maze, such as the solver, building it
+        with build() if there is none or if the maze has changed since
+        it was built.
+
+        Args:
+        name (string): The name of the index.
+        build (function): Returns a new index.
+        """
+        revision, index = self._indexes.get(name, (None, None))
+        if revision != self._revision:
+            index = build()
+            self._indexes[name] = (self._revision, index)
+        return index
+
     def _placeBreadcrumb(self, position):
         """
         Place a "breadcrumb" in the current cell to indicate that the
-        player has visited it.
+        player has visited it.  Each call increments the cell's visit
+        count.
+        """
+        self._visitCounts()[self._grid.index(*position)] += 1
+
+    def _clearBreadcrumbs(self):
         """
-        self._grid[position[0]][position[1]] += '*'
+        Remove all of the breadcrumbs from the maze.
+        """
+        self._visits = None
+
+    def _visitCounts(self):
+        """
+        Returns the array of visit counts, creating it the first time
+        it is needed (so that opening a large maze does not have to
+        wait for it).
+        """
+        if self._visits is None:
+            if self._sparse_visits:
+                self._visits = _SparseCounts()
+            else:
+                self._visits = array.array('I', [0]) * len(self._grid)
+        return self._visits
 
     def setTrail(self, trail):
         """
@@ -435,21 +1090,161 @@ class Maze:
         self._cell_height = height
         self.draw()
 
-    def save(self, filename):
+    def save(self, filename, binary = False):
         """
-        Save the maze to a text file, which can be loaded later using
-        the load method.
+        Save the maze to a file, which can be loaded later using the
+        load method.
 
         Args:
         filename (string): The name of the file to which the maze
                            should be saved.
+        binary (boolean) (optional): If binary is True, the maze is
+                                     saved in the compact binary
+                                     format (see MazeBinary) rather
+                                     than as text.
         """
-        with open(filename, 'w') as output_file:
+        with open(filename, 'wb' if binary else 'w') as output_file:
             if self._grid:
-                for row in self._grid:
-                    for cell in row:
-                        output_file.write(cell.replace('*', '') + ' ')
-                    output_file.write('\n')
+                if binary:
+                    MazeBinary.write(output_file, self._grid, self._start,
+                                     self._finish)
+                else:
+                    MazeText.write(output_file, self._grid, self._start,
+                                   self._finish)
+
+    def share(self, directory = None):
+        """
+        Publish the maze in shared memory, so that copies of it sent
+        to other processes (by pickling, as multiprocessing does) use
+        the same cells rather than copies of them.
+
+        The cells are written in the binary format (see MazeBinary) to
+        a file in /dev/shm, a file system that lives in memory, and
+        the maze (like every copy of it) then maps that file.  Only
+        the name of the file is pickled.  The file is removed by
+        unshare, when this maze is cleared or replaced, when it is
+        garbage collected, or when the program exits; copies that were
+        already unpickled keep working after that.  Copies that are
+        still pickled (such as tasks waiting in the queue of a Pool)
+        cannot be unpickled once the file is gone, so keep the maze
+        shared until every copy has been received.
+
+        Args:
+        directory (string) (optional): The directory in which to
+                                       create the file, if not
+                                       /dev/shm.
+
+        Returns:
+        The name of the file, or None if there is no maze.
+        """
+        if not self._grid:
+            return None
+        if self._shared:
+            return self._shared.filename
+        if directory is None and os.path.isdir('/dev/shm'):
+            directory = '/dev/shm'
+        fd, filename = tempfile.mkstemp(suffix='.mzb', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            MazeBinary.write(f, self._grid, self._start, self._finish)
+        spelling = self._grid.spelling
+        self._grid.closeFile()
+        self._grid = MazeBinary.load(filename)[0]
+        self._grid.spelling = spelling
+        self._shared = _SharedFile(filename)
+        return filename
+
+    def unshare(self):
+        """
+        Remove the shared memory file created by share, if there is
+        one.  The maze itself is not changed.
+        """
+        if self._shared:
+            self._shared.remove()
+            self._shared = None
+
+    def __getstate__(self):
+        """
+        Returns the state of the maze for pickling.  Only the cells
+        and the state of the player are kept; windows, graphics
+        objects, the generator and the cache are left out.
+
+        The cells are compressed with zlib.  If the maze has been
+        shared, or was loaded with paged=True, only the name of the
+        file holding the cells is kept instead.
+        """
+        grid = self._grid
+        if grid is None:
+            cells = None
+        elif self._shared:
+            cells = ('shared', self._shared.filename, grid.spelling)
+        elif isinstance(grid, MazeGrid.PagedGrid) and not grid._dirty:
+            # The copy may be unpickled in another working directory
+            cells = ('paged', os.path.abspath(grid._file.name),
+                     grid.tile_size, grid.max_tiles)
+        else:
+            cells = ('cells', grid.width, grid.height,
+                     zlib.compress(bytes(grid.cells(0, len(grid))), 1),
+                     grid.spelling)
+
+        if self._visits is None:
+            visits = None
+        elif self._sparse_visits:
+            visits = dict(self._visits)
+        else:
+            visits = zlib.compress(self._visits.tostring(), 1)
+
+        return { 'cells': cells,
+                 'visits': visits,
+                 'start': self._start,
+                 'finish': self._finish,
+                 'position': self._position,
+                 'orientation': self._orientation,
+                 'show': self._show,
+                 'trail': self._trail,
+                 'cell_width': self._cell_width,
+                 'cell_height': self._cell_height
+                 }
+
+    def __setstate__(self, state):
+        """
+        Restore a maze pickled with __getstate__.  Nothing is drawn
+        until the maze changes.
+        """
+        self.__init__()
+        self._show = state['show']
+        self._trail = state['trail']
+        self._cell_width = state['cell_width']
+        self._cell_height = state['cell_height']
+
+        cells = state['cells']
+        if cells is None:
+            return
+        if cells[0] == 'shared':
+            if not os.path.exists(cells[1]):
+                raise IOError("the shared maze " + cells[1] + " has been "
+                              "removed (see Maze.share)")
+            self._grid = MazeBinary.load(cells[1])[0]
+            self._grid.spelling = cells[2]
+        elif cells[0] == 'paged':
+            self._grid = MazeBinary.loadPaged(*cells[1:])[0]
+            self._sparse_visits = True
+        else:
+            self._grid = MazeGrid.MazeGrid(cells[1], cells[2],
+                                           bytearray(zlib.decompress(cells[3])))
+            self._grid.spelling = cells[4]
+
+        visits = state['visits']
+        if isinstance(visits, dict):
+            self._visitCounts().update(visits)
+        elif visits is not None:
+            self._visits = array.array('I')
+            self._visits.fromstring(zlib.decompress(visits))
+
+        self._start = state['start']
+        self._finish = state['finish']
+        self._position = state['position']
+        while self._orientation != state['orientation']:
+            self._orientation = self._dirs.next()
 
     def screenshot(self, filename):
         """
@@ -492,7 +1287,9 @@ class Maze:
 
     def _drawBreadcrumb(self, pos):
         row_no, col_no = pos
-        if '*' in self._grid[row_no][col_no] and self._trail and\
+        if self._visits is not None and\
+                self._visits[self._grid.index(row_no, col_no)] and\
+                self._trail and\
                 self._show and self._win:
             x_coord = col_no * (self._cell_width +\
                                     self._cell_sep) +\
@@ -514,8 +1311,8 @@ class Maze:
         while len(self._breadcrumbs) > 0:
             bc = self._breadcrumbs.pop()
             bc.undraw()
-        for row_no, line in enumerate(self._grid):
-            for col_no, c in enumerate(line):
+        for row_no in range(self._grid.height):
+            for col_no in range(self._grid.width):
                 self._drawBreadcrumb((row_no, col_no))
 
     def restart(self):
@@ -526,9 +1323,7 @@ class Maze:
             self._position = self._start
 
             # Remove breadcrumbs
-            for row_no, row in enumerate(self._grid):
-                for cell_no, cell in enumerate(row):
-                    self._grid[row_no][cell_no] = cell.replace('*', '')
+            self._clearBreadcrumbs()
 
             # Turn player to face north
             while self._orientation != 'N':
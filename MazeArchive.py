@@ -0,0 +1,185 @@
+"""
+A compact encoding for archiving mazes.
+
+Every passage of a maze is recorded exactly once, by storing for each
+cell only whether it is open to the east and to the south; the north
+and west sides follow from the neighboring cells.  That takes two bits
+per cell, packed four cells to a byte.  A perfect maze has only about
+one passage per cell, so the packed bits are then compressed with
+zlib, which brings a typical random maze down to 1-2 bits per cell
+(compared with 3-4 bytes per cell in the text format).
+
+The rows are split into chunks that are compressed separately, and
+each chunk also records which cells of its first row are open to the
+north, so a band of rows can be decoded without touching the rest of
+the maze.
+"""
+import struct, zlib, operator
+import MazeGrid
+
+# magic, width, height, start row, start column, finish row, finish
+# column, rows per chunk, number of chunks
+_header = struct.Struct('<4s8I')
+_magic = b'MZA1'
+
+# Each chunk is located by an offset into the data (relative to the end
+# of the offset table); there is one more offset than chunks.
+_offset = struct.Struct('<Q')
+
+_N, _E, _S, _W = (MazeGrid.MazeGrid.N, MazeGrid.MazeGrid.E,
+                  MazeGrid.MazeGrid.S, MazeGrid.MazeGrid.W)
+
+def _table(f):
+    return bytes(bytearray(f(c) & 0xff for c in range(256)))
+
+# Cell flags to two-bit codes (1 = open east, 2 = open south) and back
+_flags_to_code = _table(lambda c: (1 if c & _E else 0) | (2 if c & _S else 0))
+_code_to_flags = _table(lambda c: (_E if c & 1 else 0) | (_S if c & 2 else 0))
+_flags_to_north = _table(lambda c: 1 if c & _N else 0)
+_code_to_north = _table(lambda c: _N if c & 1 else 0)
+_east_to_west = _table(lambda c: _W if c & _E else 0)
+_south_to_north = _table(lambda c: _N if c & _S else 0)
+
+# Shift a two-bit code into, or out of, each quarter of a byte
+_shift_in = [ _table(lambda c, i=i: (c & 3) << (2 * i)) for i in range(4) ]
+_shift_out = [ _table(lambda c, i=i: (c >> (2 * i)) & 3) for i in range(4) ]
+
+def _or(a, b):
+    """
+    Returns the bitwise or of two bytearrays of the same length.
+    """
+    return bytearray(map(operator.or_, a, b))
+
+def _pack(codes):
+    """
+    Pack a bytearray of two-bit codes four to a byte.
+    """
+    n_bytes = (len(codes) + 3) // 4
+    codes = codes + bytearray(4 * n_bytes - len(codes))
+    packed = codes[0::4].translate(_shift_in[0])
+    for i in range(1, 4):
+        packed = _or(packed, codes[i::4].translate(_shift_in[i]))
+    return packed
+
+def _unpack(packed, n_codes):
+    """
+    Unpack n_codes two-bit codes from a bytearray (the reverse of
+    _pack).
+    """
+    codes = bytearray(4 * len(packed))
+    for i in range(4):
+        codes[i::4] = packed.translate(_shift_out[i])
+    return codes[:n_codes]
+
+def encode(grid, start, finish, rows_per_chunk = 256):
+    """
+    Encode a maze.
+
+    Args:
+    grid (MazeGrid): The cells of the maze.
+    start (tuple): (row, column) of the starting point.
+    finish (tuple): (row, column) of the end point.
+    rows_per_chunk (int) (optional): The number of rows in each
+                                     separately decodable chunk.
+
+    Returns:
+    The encoded maze, as a string of bytes.
+    """
+    width, height = grid.width, grid.height
+    chunks = []
+    for first_row in range(0, height, rows_per_chunk):
+        last_row = min(first_row + rows_per_chunk, height)
+        top = grid.cells(first_row * width, (first_row + 1) * width)
+        cells = grid.cells(first_row * width, last_row * width)
+        chunks.append(zlib.compress(
+            bytes(_pack(top.translate(_flags_to_north)) +
+                  _pack(cells.translate(_flags_to_code)))))
+
+    parts = [ _header.pack(_magic, width, height, start[0], start[1],
+                           finish[0], finish[1], rows_per_chunk,
+                           len(chunks)) ]
+    offset = 0
+    for chunk in chunks:
+        parts.append(_offset.pack(offset))
+        offset += len(chunk)
+    parts.append(_offset.pack(offset))
+    return b''.join(parts + chunks)
+
+def decode(data):
+    """
+    Decode a whole maze.
+
+    Args:
+    data (string): The encoded maze, as returned by encode.
+
+    Returns:
+    A (grid, start, finish) tuple.
+    """
+    header = _readHeader(data)
+    grid = decodeRows(data, 0, header[2])
+    return grid, (header[3], header[4]), (header[5], header[6])
+
+def decodeRows(data, first_row, last_row):
+    """
+    Decode a band of rows of a maze, decompressing only the chunks
+    that contain them.
+
+    Args:
+    data (string): The encoded maze, as returned by encode.
+    first_row (int): The first row to decode.
+    last_row (int): The row after the last one to decode.
+
+    Returns:
+    A MazeGrid holding just the rows requested.  The cells of its
+    first row keep their north openings, even though the row above is
+    not part of the grid.
+    """
+    magic, width, height, start_row, start_col, finish_row, finish_col,\
+        rows_per_chunk, n_chunks = _readHeader(data)
+    if not 0 <= first_row <= last_row <= height:
+        raise ValueError("rows out of range")
+    table_end = _header.size + _offset.size * (n_chunks + 1)
+
+    cells = bytearray()
+    first_chunk = first_row // rows_per_chunk
+    last_chunk = (last_row + rows_per_chunk - 1) // rows_per_chunk
+    for chunk in range(first_chunk, last_chunk):
+        begin = _offset.unpack_from(data, _header.size +
+                                    _offset.size * chunk)[0]
+        end = _offset.unpack_from(data, _header.size +
+                                  _offset.size * (chunk + 1))[0]
+        payload = bytearray(zlib.decompress(
+            data[table_end + begin:table_end + end]))
+        n_rows = min(rows_per_chunk, height - chunk * rows_per_chunk)
+        top_bytes = (width + 3) // 4
+        north = _unpack(payload[:top_bytes], width).translate(_code_to_north)
+        codes = _unpack(payload[top_bytes:], width * n_rows)
+        chunk_cells = codes.translate(_code_to_flags)
+
+        # The west sides follow from the east sides of the cells to
+        # the left (the last column is never open to the east, so
+        # nothing carries over from one row to the next), and the north
+        # sides from the south sides of the cells above.
+        chunk_cells[1:] = _or(chunk_cells[1:],
+                              chunk_cells[:-1].translate(_east_to_west))
+        chunk_cells[width:] = _or(chunk_cells[width:],
+                                  chunk_cells[:-width].translate(
+                                      _south_to_north))
+        chunk_cells[:width] = _or(chunk_cells[:width], north)
+
+        first = max(first_row - chunk * rows_per_chunk, 0) * width
+        last = (min(last_row - chunk * rows_per_chunk, n_rows)) * width
+        cells += chunk_cells[first:last]
+
+    return MazeGrid.MazeGrid(width, last_row - first_row, cells)
+
+def _readHeader(data):
+    """
+    Returns the fields of the header of an encoded maze.
+    """
+    if len(data) < _header.size:
+        raise ValueError("data is too short to be an archived maze")
+    fields = _header.unpack_from(data)
+    if fields[0] != _magic:
+        raise ValueError("data is not an archived maze")
+    return fields
@@ -0,0 +1,135 @@
+"""
+Reading and writing mazes in the binary format.
+
+The file starts with a fixed-size header (see _header), followed by
+the cells of the maze in row-major order, packed two to a byte as
+described in MazeGrid.PackedGrid.  Because the cells are stored
+exactly as PackedGrid expects them, a maze can be opened by memory
+mapping the file, without reading or copying the cells.  Processes
+that open the same file share its pages in the page cache.
+"""
+import os, mmap, struct, ctypes
+import MazeGrid
+
+# magic, version, width, height, start row, start column, finish row,
+# finish column
+_header = struct.Struct('<4s7I')
+_magic = b'MAZB'
+_version = 1
+
+# Number of cells packed at a time when writing (must be even)
+_chunk_cells = 1 << 20
+
+def isBinary(filename):
+    """
+    Returns True if the file holds a maze in the binary format.
+    """
+    with open(filename, 'rb') as f:
+        return f.read(len(_magic)) == _magic
+
+def write(f, grid, start, finish):
+    """
+    Write a maze to a binary file.
+
+    Args:
+    f (file object): The file object to which the maze is written.  It
+                     must be opened in binary mode.
+    grid (MazeGrid): The cells of the maze.  Only the low four bits
+                     of each cell are written.
+    start (tuple): (row, column) of the starting point.
+    finish (tuple): (row, column) of the end point.
+    """
+    f.write(_header.pack(_magic, _version, grid.width, grid.height,
+                         start[0], start[1], finish[0], finish[1]))
+    n_cells = len(grid)
+    for first in range(0, n_cells, _chunk_cells):
+        last = min(first + _chunk_cells, n_cells)
+        f.write(MazeGrid.packNibbles(bytearray(grid.cells(first, last))))
+
+def load(filename):
+    """
+    Open a maze stored in the binary format, by memory mapping it.
+
+    The map is copy-on-write: changes made to the grid are seen only
+    by this process, and are not written back to the file.
+
+    Args:
+    filename (string): The name of the file containing the maze.
+
+    Returns:
+    A (grid, start, finish) tuple, where grid is a MazeGrid.PackedGrid
+    that reads its cells straight from the mapped file.
+
+    Raises:
+    ValueError if the file is not a maze in the binary format.
+    """
+    with open(filename, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    width, height, start, finish = _readHeader(data, len(data))
+
+    cells = (ctypes.c_ubyte * len(data)).from_buffer(data)
+    grid = MazeGrid.PackedGrid(width, height, cells, _header.size)
+    return grid, start, finish
+
+def loadPaged(filename, tile_size = 64, max_tiles = 1024):
+    """
+    Open a maze stored in the binary format, reading its cells in
+    tiles only as they are used (see MazeGrid.PagedGrid).  Unlike
+    load, this does not map the whole file, so it works for mazes
+    larger than the address space or the memory of the machine.
+
+    Args:
+    filename (string): The name of the file containing the maze.
+    tile_size (int) (optional): The width and height of a tile
+                                (number of cells).
+    max_tiles (int) (optional): The greatest number of tiles to keep
+                                in memory.
+
+    Returns:
+    A (grid, start, finish) tuple, where grid is a MazeGrid.PagedGrid.
+
+    Raises:
+    ValueError if the file is not a maze in the binary format.
+    """
+    f = open(filename, 'rb')
+    try:
+        width, height, start, finish = _readHeader(
+            f.read(_header.size), os.fstat(f.fileno()).st_size)
+    except ValueError:
+        f.close()
+        raise
+    grid = MazeGrid.PagedGrid(width, height, f, _header.size, tile_size,
+                              max_tiles)
+    return grid, start, finish
+
+def _readHeader(data, file_size):
+    """
+    Check the header of a binary maze.
+
+    Args:
+    data (string): The start of the file (at least the header).
+    file_size (int): The size of the whole file.
+
+    Returns:
+    A (width, height, start, finish) tuple.
+
+    Raises:
+    ValueError if the file is not a maze in the binary format.
+    """
+    if len(data) < _header.size:
+        raise ValueError("file is too short to be a binary maze")
+    magic, version, width, height, start_row, start_col, finish_row,\
+        finish_col = _header.unpack_from(data)
+    if magic != _magic:
+        raise ValueError("file is not a binary maze")
+    if version != _version:
+        raise ValueError("unsupported binary maze version {}".format(version))
+    if file_size < _header.size + (width * height + 1) // 2:
+        raise ValueError("file is too short for a {} x {} maze".format(
+            width, height))
+    for name, row, col in [ ('start', start_row, start_col),
+                            ('finish', finish_row, finish_col) ]:
+        if not (0 <= row < height and 0 <= col < width):
+            raise ValueError("{} point ({}, {}) is outside the {} x {} "
+                             "maze".format(name, row, col, width, height))
+    return width, height, (start_row, start_col), (finish_row, finish_col)
@@ -0,0 +1,152 @@
+import os, struct, zlib, collections, tempfile
+import MazeGrid
+
+class MazeCache:
+    """
+    A cache of generated mazes, keyed on the generator algorithm and
+    its arguments (usually width, height and seed).
+
+    Recently used mazes are kept in memory, up to a fixed number.  If
+    a directory is given, every generated maze is also written there
+    in a compact binary form, and mazes that have dropped out of
+    memory (or were generated by another process) are read back from
+    it instead of being generated again.
+
+    Mazes generated without a seed are random by design, so they are
+    never cached.
+    """
+    # Header of the files in the cache directory: magic, width,
+    # height, start row, start column, finish row, finish column.
+    # The header is followed by the zlib-compressed cells of the grid.
+    _header = struct.Struct('<4s6I')
+    _magic = b'MZC1'
+
+    def __init__(self, size = 128, directory = None):
+        """
+        Create a new, empty cache.
+
+        Args:
+        size (int) (optional): The greatest number of mazes to keep in
+                               memory.
+        directory (string) (optional): The directory in which to keep
+                                       mazes on disk.  It is created if
+                                       it does not exist.
+        """
+        self.size = size
+        self.directory = directory
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._mazes = collections.OrderedDict()
+
+        # Counters for tuning the size of the cache
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """
+        Returns the number of mazes held in memory.
+        """
+        return len(self._mazes)
+
+    def generate(self, generator, algorithm, *args, **options):
+        """
+        Returns a maze from the cache, generating it if necessary.
+
+        Args:
+        generator (MazeGenerator): The generator used on a cache miss.
+        algorithm (string): The name of the generator method, such as
+                            'random' or 'spiral'.
+        args: The arguments for that method.
+        options: Keyword arguments for that method that do not change
+                 the maze it makes, such as the number of worker
+                 processes for tiled.  They are not part of the key,
+                 so the same maze is found whatever they are.
+
+        Returns:
+        A (grid, start, finish) tuple.  The grid is a copy, which the
+        caller is free to change.
+        """
+        key = (algorithm,) + args
+        if algorithm not in ('line', 'spiral') and\
+                (len(args) < 3 or args[2] is None):
+            return getattr(generator, algorithm)(*args, **options)
+
+        if key in self._mazes:
+            self.hits += 1
+            maze = self._mazes.pop(key)
+        else:
+            maze = self._read(key)
+            if maze:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                maze = getattr(generator, algorithm)(*args, **options)
+                self._write(key, maze)
+        self._mazes[key] = maze
+        while len(self._mazes) > self.size:
+            self._mazes.popitem(last=False)
+
+        grid, start, finish = maze
+        return grid.copy(), start, finish
+
+    def clear(self):
+        """
+        Remove every maze from memory and reset the counters.  Files in
+        the cache directory are kept.
+        """
+        self._mazes.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        """
+        Returns the name of the cache file for a key, or None if there
+        is no cache directory.
+        """
+        if self.directory:
+            return os.path.join(self.directory,
+                                '_'.join(str(k) for k in key) + '.mzc')
+
+    def _read(self, key):
+        """
+        Returns the (grid, start, finish) tuple stored on disk for a
+        key, or None if there is none, or if the file cannot be read
+        (for instance because it was cut short).  The disk is only a
+        second level of the cache, so a bad file is treated as a miss,
+        and replaced when the maze is generated again.
+        """
+        path = self._path(key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            magic, width, height, start_row, start_col, finish_row,\
+                finish_col = self._header.unpack_from(data)
+            if magic != self._magic:
+                return None
+            walls = bytearray(zlib.decompress(data[self._header.size:]))
+            grid = MazeGrid.MazeGrid(width, height, walls)
+        except (IOError, struct.error, zlib.error, ValueError):
+            return None
+        return grid, (start_row, start_col), (finish_row, finish_col)
+
+    def _write(self, key, maze):
+        """
+        Store a (grid, start, finish) tuple on disk, if there is a
+        cache directory.  The file is written under a temporary name
+        and then renamed, so that other processes never see part of it.
+        """
+        path = self._path(key)
+        if not path:
+            return
+        grid, start, finish = maze
+        header = self._header.pack(self._magic, grid.width, grid.height,
+                                   start[0], start[1], finish[0], finish[1])
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(zlib.compress(bytes(grid.walls), 1))
+        os.rename(temp_path, path)
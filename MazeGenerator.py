@@ -1,4 +1,6 @@
-import random, math
+import os, random, math, array, collections, multiprocessing, mmap,\
+    tempfile, ctypes, hashlib, struct
+import MazeGrid, MazeBinary
 
 class MazeGenerator:
     directions = ['N', 'E', 'S', 'W']
@@ -9,20 +11,23 @@ class MazeGenerator:
                      }
 
     def __init__(self):
-        pass
+        # Each generator has its own random number stream, so that
+        # generators in different threads do not interfere with each
+        # other or with other users of the random module
+        self._random = random.Random()
 
     def line(self, length):
         if length < 1:
             raise ValueError("length must be >= 1")
-        self.grid = [ [ '' ] * length ]
-        if length > 1:
-            self.grid[0][0] += 'E'
-            self.grid[0][-1] += 'W'
-        for i in range(1, length-1):
-            self.grid[0][i] += 'WE'
-        start = (0, 0)
-        finish = (0, length - 1)
-        return self.grid, start, finish
+        return self._drain(self._carveLine(length))
+
+    def _carveLine(self, length):
+        self.grid = MazeGrid.MazeGrid(length, 1)
+        for i in range(length - 1):
+            self.grid.carve(0, i, 'E')
+            yield i, 'E'
+        self.start = (0, 0)
+        self.finish = (0, length - 1)
 
     def spiral(self, width, height):
         """
@@ -32,7 +37,10 @@ class MazeGenerator:
         width (int): The width of the maze (number of cells).
         height (int): The height of the maze (number of cells).
         """
-        grid = [ [''] * width for i in range(height) ]
+        return self._drain(self._carveSpiral(width, height))
+
+    def _carveSpiral(self, width, height):
+        grid = self.grid = MazeGrid.MazeGrid(width, height)
         n_layers = int(min(math.ceil(height / 2.0),
                            math.ceil(width / 2.0)))
         for layer in range(n_layers):
@@ -40,84 +48,944 @@ class MazeGenerator:
             start_col = max(1, layer)
             row = layer
             for col in range(start_col, width - layer):
-                grid[row][col-1] += 'E'
-                grid[row][col] += 'W'
+                grid.carve(row, col - 1, 'E')
+                yield grid.index(row, col - 1), 'E'
 
             # Carve the last column
             col = width - layer - 1
             for row in range(layer + 1, height - layer):
-                grid[row-1][col] += 'S'
-                grid[row][col] += 'N'
+                grid.carve(row - 1, col, 'S')
+                yield grid.index(row - 1, col), 'S'
 
             # Carve the last row
             if height % 2 == 0 or layer < n_layers - 1:
                 start_col = width - layer - 2
                 for col in range(width - layer - 2, layer - 1, -1):
                     row = height - layer - 1
-                    grid[row][col+1] += 'W'
-                    grid[row][col] += 'E'
+                    grid.carve(row, col + 1, 'W')
+                    yield grid.index(row, col + 1), 'W'
             
             # Carve the first column
             if width % 2 == 0 or layer < n_layers - 1:
                 for row in range(height - layer - 2, layer, -1):
                     col = layer
-                    grid[row+1][col] += 'N'
-                    grid[row][col] += 'S'
+                    grid.carve(row + 1, col, 'N')
+                    yield grid.index(row + 1, col), 'N'
             
-        start = (0, 0)
-        end = (row, col)
-        grid[start[0]][start[1]] += '^'
-        grid[end[0]][end[1]] += '$'
-        return grid, start, end
+        self.start = (0, 0)
+        self.finish = (row, col)
 
     def random(self, width, height, seed = None):
         """
         Create a random maze with given dimensions.
         """
-        self.grid = [ [''] * width for i in range(height) ]
-        random.seed(seed)
-        start = ( random.randint(0, len(self.grid) - 1),
-                  random.randint(0, len(self.grid[0]) - 1)
+        return self._drain(self._carveRandom(width, height, seed))
+
+    def _carveRandom(self, width, height, seed):
+        self.grid = MazeGrid.MazeGrid(width, height)
+        self._random.seed(seed)
+        start = ( self._random.randint(0, height - 1),
+                  self._random.randint(0, width - 1)
                   )
-        visited = set([start])
-        self._createPath(start, visited)
-        start = ( random.randint(0, len(self.grid) - 1), 0 )
-        finish = ( random.randint(0, len(self.grid) - 1),
-                   len(self.grid[0]) - 1 )
-        self.grid[start[0]][start[1]] += '^'
-        self.grid[finish[0]][finish[1]] += '$'
-        return self.grid, start, finish
-
-    def _createPath(self, cell, visited):
-        while True:
-            neighbors = self._getNeighbors(cell, visited)
-            if not neighbors:
-                return
-            next_cell = random.choice(neighbors)
-            direction = self._getRelativeDir(cell, next_cell)
-            self.grid[cell[0]][cell[1]] += direction
-            self.grid[next_cell[0]][next_cell[1]] +=\
-                self.opposite_dir[direction]
-            visited.add(next_cell)
-            self._createPath(next_cell, visited)
-
-    def _getNeighbors(self, cell, visited):
-        potential_neighbors = [ (max(cell[0] - 1, 0), cell[1]),          # above
-                                (min(cell[0] + 1, len(self.grid) - 1), cell[1]),  # below
-                                (cell[0], max(cell[1] - 1, 0)),          # left
-                                (cell[0], min(cell[1] + 1, len(self.grid[0]) - 1))# right
-                                ]
-        neighbors = [ c for c in potential_neighbors if c != cell and c not in visited]
-        return neighbors
-
-    def _getRelativeDir(self, c1, c2):
-        if c2 == (c1[0] + 1, c1[1]):
-            return 'S'
-        elif c2 == (c1[0] - 1, c1[1]):
-            return 'N'
-        elif c2 == (c1[0], c1[1] - 1):
-            return 'W'
-        elif c2 == (c1[0], c1[1] + 1):
-            return 'E'
+        for event in self._createPath(start[0] * width + start[1]):
+            yield event
+        self._randomEnds()
+
+    def randomToFile(self, filename, width, height, seed = None):
+        """
+        Create a random maze, exactly as random would with the same
+        seed, and write it to a file in the binary format (see
+        MazeBinary) without ever holding it in memory.
+
+        The cells are carved in a scratch file, one byte per cell,
+        which is memory mapped so that the operating system can write
+        out pages that are not in use.  Besides the open-side flags,
+        each byte holds a visited bit and the direction back to the
+        cell it was reached from, so the depth-first search backtracks
+        by following those directions instead of keeping a stack.  The
+        resident memory used therefore does not grow with the size of
+        the maze.  The scratch file is created next to filename, and
+        removed when the maze is finished.
+
+        Args:
+        filename (string): The name of the file to write.
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+
+        Returns:
+        A (start, finish) tuple.  self.grid is set to None, since the
+        maze is only on disk; open it with MazeBinary.load or
+        MazeBinary.loadPaged.
+        """
+        directory = os.path.dirname(os.path.abspath(filename))
+        with tempfile.TemporaryFile(dir=directory) as scratch:
+            scratch.truncate(width * height)
+            data = mmap.mmap(scratch.fileno(), width * height)
+            cells = (ctypes.c_ubyte * len(data)).from_buffer(data)
+            self.grid = MazeGrid.MazeGrid(width, height, data)
+            self._random.seed(seed)
+            start = ( self._random.randint(0, height - 1),
+                      self._random.randint(0, width - 1)
+                      )
+            self._createPathInPlace(cells, width, height,
+                                    start[0] * width + start[1])
+            del cells
+            self._randomEnds()
+            with open(filename, 'wb') as f:
+                MazeBinary.write(f, self.grid, self.start, self.finish)
+            data.close()
+        self.grid = None
+        return self.start, self.finish
+
+    def binaryTree(self, width, height, seed = None):
+        """
+        Create a random maze with the Binary-Tree algorithm.  Every
+        cell is opened either to the north or to the east; the
+        choices for all of the cells are made at once with NumPy.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        return self._drain(self._carveBinaryTree(width, height, seed,
+                                                 False))
+
+    def _carveBinaryTree(self, width, height, seed = None, report = True):
+        import numpy
+        self.grid = MazeGrid.MazeGrid(width, height)
+        rng = numpy.random.RandomState(seed)
+        walls = numpy.frombuffer(self.grid.walls,
+                                 dtype=numpy.uint8).reshape(height, width)
+
+        north = rng.randint(0, 2, size=(height, width)).astype(bool)
+        north[0, :] = False     # the top row can only be opened east
+        north[1:, -1] = True    # the last column can only be opened north
+        east = ~north
+        east[0, -1] = False     # the top right corner has no way out
+
+        for event in self._openRows(walls, north, east, report):
+            yield event
+        self._finishRandom(rng)
+
+    def sidewinder(self, width, height, seed = None):
+        """
+        Create a random maze with the Sidewinder algorithm.  Each row
+        is split into runs of cells joined east-west, and one cell in
+        each run is opened to the north.  The top row is a single
+        corridor.  The runs of all of the rows are found at once with
+        NumPy.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        return self._drain(self._carveSidewinder(width, height, seed,
+                                                 False))
+
+    def _carveSidewinder(self, width, height, seed = None, report = True):
+        import numpy
+        self.grid = MazeGrid.MazeGrid(width, height)
+        rng = numpy.random.RandomState(seed)
+        walls = numpy.frombuffer(self.grid.walls,
+                                 dtype=numpy.uint8).reshape(height, width)
+
+        east = rng.randint(0, 2, size=(height, width)).astype(bool)
+        east[0, :] = True
+        east[:, -1] = False
+
+        north = numpy.zeros((height, width), dtype=bool)
+        if height > 1:
+            # A run ends at every cell that is not opened east.  The
+            # last column always ends a run, so runs never span rows.
+            ends = numpy.flatnonzero(~east[1:].ravel())
+            starts = numpy.concatenate(([0], ends[:-1] + 1))
+            lengths = ends - starts + 1
+            chosen = starts + (rng.random_sample(len(lengths)) *
+                               lengths).astype(numpy.intp)
+            north.ravel()[width + chosen] = True
+
+        for event in self._openRows(walls, north, east, report):
+            yield event
+        self._finishRandom(rng)
+
+    def eller(self, width, height, seed = None):
+        """
+        Create a random maze with Eller's algorithm.  See ellerRows
+        for a version that does not hold the whole maze in memory.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        return self._drain(self._carveEller(width, height, seed))
+
+    def _carveEller(self, width, height, seed):
+        rows, self.start, self.finish = self.ellerRows(width, height, seed)
+        self.grid = MazeGrid.MazeGrid(width, height)
+        E, S = MazeGrid.MazeGrid.E, MazeGrid.MazeGrid.S
+        first = 0
+        for row in rows:
+            self.grid.walls[first:first + width] = row
+            for col in range(width):
+                if row[col] & E:
+                    yield first + col, 'E'
+                if row[col] & S:
+                    yield first + col, 'S'
+            first += width
+
+    def ellerRows(self, width, height, seed = None):
+        """
+        Create a random maze with Eller's algorithm, one row at a
+        time.  Only the current row is kept in memory, so the height
+        of the maze is not limited by the available memory.  The rows
+        can be written straight to a file with MazeText.writeRows.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+
+        Returns:
+        A (rows, start, finish) tuple, where rows is an iterator that
+        yields one bytearray of open-side flags per row.
+        """
+        rng = random.Random(seed)
+        start = ( rng.randint(0, height - 1), 0 )
+        finish = ( rng.randint(0, height - 1), width - 1 )
+        return self._ellerRows(width, height, rng), start, finish
+
+    def _ellerRows(self, width, height, rng):
+        N, E, S, W = (MazeGrid.MazeGrid.N, MazeGrid.MazeGrid.E,
+                      MazeGrid.MazeGrid.S, MazeGrid.MazeGrid.W)
+        sets = [0] * width
+        down = bytearray(width)
+        next_set = 0
+        for row_no in range(height):
+            last_row = row_no == height - 1
+
+            # Cells that were not joined to the row above start out in
+            # sets of their own
+            row = bytearray(width)
+            for col in range(width):
+                if down[col]:
+                    row[col] = N
+                else:
+                    sets[col] = next_set
+                    next_set += 1
+
+            # Randomly join neighboring cells that are in different
+            # sets.  On the last row, every such pair must be joined.
+            parent = {}
+            for col in range(width - 1):
+                a = self._findSet(parent, sets[col])
+                b = self._findSet(parent, sets[col + 1])
+                if a != b and (last_row or rng.random() < 0.5):
+                    row[col] |= E
+                    row[col + 1] |= W
+                    parent[b] = a
+            for col in range(width):
+                sets[col] = self._findSet(parent, sets[col])
+
+            # Randomly join cells to the row below, making sure that
+            # every set is joined at least once
+            if not last_row:
+                down = bytearray(width)
+                joined = set()
+                for col in range(width):
+                    if rng.random() < 0.5:
+                        down[col] = 1
+                        joined.add(sets[col])
+                unjoined = {}
+                order = []
+                for col in range(width):
+                    if sets[col] not in joined:
+                        if sets[col] not in unjoined:
+                            unjoined[sets[col]] = []
+                            order.append(sets[col])
+                        unjoined[sets[col]].append(col)
+                for s in order:
+                    down[rng.choice(unjoined[s])] = 1
+                for col in range(width):
+                    if down[col]:
+                        row[col] |= S
+
+            yield row
+
+    def _findSet(self, parent, s):
+        """
+        Returns the representative of set s in the disjoint-set forest
+        parent (a dict mapping each merged set to its parent).
+        """
+        while s in parent:
+            p = parent[s]
+            if p in parent:
+                parent[s] = parent[p]
+            s = p
+        return s
+
+    def wilson(self, width, height, seed = None):
+        """
+        Create a random maze with Wilson's algorithm.  Every possible
+        (perfect) maze of the given size is equally likely.
+
+        The maze is grown from a random root cell by loop-erased random
+        walks.  Each walk records, in a flat array, the direction in
+        which it last left each cell; following those directions from
+        the start of the walk gives the walk with its loops erased.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        return self._drain(self._carveWilson(width, height, seed))
+
+    def _carveWilson(self, width, height, seed):
+        self.grid = MazeGrid.MazeGrid(width, height)
+        self._random.seed(seed)
+        rnd = self._random.random
+        walls = self.grid.walls
+        n_cells = width * height
+        last_row = n_cells - width
+
+        # Indexed by direction: N, E, S, W
+        steps = [ -width, 1, width, -1 ]
+        bits = [ MazeGrid.MazeGrid.N, MazeGrid.MazeGrid.E,
+                 MazeGrid.MazeGrid.S, MazeGrid.MazeGrid.W ]
+        opposite_bits = bits[2:] + bits[:2]
+
+        in_tree = bytearray(n_cells)
+        exits = bytearray(n_cells)
+        in_tree[self._random.randint(0, n_cells - 1)] = 1
+        for first in range(n_cells):
+            # Random walk until the walk reaches the tree
+            cell = first
+            while not in_tree[cell]:
+                d = int(rnd() * 4)
+                if (d == 0 and cell < width) or\
+                        (d == 1 and cell % width == width - 1) or\
+                        (d == 2 and cell >= last_row) or\
+                        (d == 3 and cell % width == 0):
+                    continue
+                exits[cell] = d
+                cell += steps[d]
+
+            # Add the loop-erased walk to the tree
+            cell = first
+            while not in_tree[cell]:
+                in_tree[cell] = 1
+                d = exits[cell]
+                next_cell = cell + steps[d]
+                walls[cell] |= bits[d]
+                walls[next_cell] |= opposite_bits[d]
+                yield cell, self.directions[d]
+                cell = next_cell
+
+        self._randomEnds()
+
+    def kruskal(self, width, height, seed = None):
+        """
+        Create a random maze with Kruskal's algorithm.
+
+        Every wall between two cells is listed once, in a flat array,
+        and the list is shuffled.  Walls are then removed in that
+        order whenever the cells on either side are not yet connected.
+        Connectivity is tracked with a disjoint-set forest stored in
+        flat arrays, using path compression and union by rank, so
+        memory use is a fixed number of bytes per cell.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        return self._drain(self._carveKruskal(width, height, seed))
+
+    def _carveKruskal(self, width, height, seed):
+        self.grid = MazeGrid.MazeGrid(width, height)
+        self._random.seed(seed)
+        walls = self.grid.walls
+        n_cells = width * height
+        E, S, W, N = (MazeGrid.MazeGrid.E, MazeGrid.MazeGrid.S,
+                      MazeGrid.MazeGrid.W, MazeGrid.MazeGrid.N)
+
+        # Wall 2 * cell is the east wall of cell, and wall 2 * cell + 1
+        # is its south wall
+        edges = array.array('l', (2 * cell + 1
+                                  for cell in range(n_cells - width)))
+        edges.extend(2 * cell for cell in range(n_cells)
+                     if cell % width != width - 1)
+        self._random.shuffle(edges)
+
+        parent = array.array('l', range(n_cells))
+        rank = bytearray(n_cells)
+        remaining = n_cells - 1
+        for edge in edges:
+            if remaining == 0:
+                break
+            cell = edge >> 1
+            if edge & 1:
+                other = cell + width
+            else:
+                other = cell + 1
+
+            # Find the roots of both cells, compressing the paths
+            a = cell
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            b = other
+            while parent[b] != b:
+                parent[b] = parent[parent[b]]
+                b = parent[b]
+            if a == b:
+                continue
+
+            if rank[a] < rank[b]:
+                a, b = b, a
+            parent[b] = a
+            if rank[a] == rank[b]:
+                rank[a] += 1
+            remaining -= 1
+
+            if edge & 1:
+                walls[cell] |= S
+                walls[other] |= N
+                yield cell, 'S'
+            else:
+                walls[cell] |= E
+                walls[other] |= W
+                yield cell, 'E'
+
+        self._randomEnds()
+
+    def division(self, width, height, seed = None):
+        """
+        Create a random maze by recursive division.  The maze starts
+        with no interior walls.  Each region is split in two by a wall
+        with a single gap in it, and the process is repeated on the
+        two halves until the regions are one cell wide.
+
+        The regions are divided a level at a time: all of the regions
+        made by the previous level are split together, with NumPy,
+        choosing every wall and gap at once and clearing the flags of
+        all of the walls with one indexed write per side.  There are
+        only about twice as many levels as the log of the larger
+        dimension of the maze, so very little is done per region in
+        Python.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        """
+        return self._drain(self._carveDivision(width, height, seed, False))
+
+    def _carveDivision(self, width, height, seed = None, report = True):
+        import numpy
+        G = MazeGrid.MazeGrid
+        rng = numpy.random.RandomState(seed)
+        self.grid = G(width, height,
+                      bytearray([ G.N | G.E | G.S | G.W ]) * (width * height))
+        walls = numpy.frombuffer(self.grid.walls, dtype=numpy.uint8)
+        not_n, not_e, not_s, not_w = [ numpy.uint8(0xf & ~bit)
+                                       for bit in (G.N, G.E, G.S, G.W) ]
+
+        # Close the outer edges of the maze
+        edges = walls.reshape(height, width)
+        edges[0, :] &= not_n
+        edges[-1, :] &= not_s
+        edges[:, 0] &= not_w
+        edges[:, -1] &= not_e
+
+        # The regions still to be divided: top row, left column, width
+        # and height of each
+        top = numpy.zeros(1, dtype=numpy.intp)
+        left = numpy.zeros(1, dtype=numpy.intp)
+        region_width = numpy.array([ width ], dtype=numpy.intp)
+        region_height = numpy.array([ height ], dtype=numpy.intp)
+        while len(top):
+            finished = (region_width < 2) | (region_height < 2)
+            if report:
+                # Each finished region is a single corridor
+                for row, col, w, h in zip(top[finished], left[finished],
+                                          region_width[finished],
+                                          region_height[finished]):
+                    first = int(row) * width + int(col)
+                    for i in range(h - 1):
+                        yield first + i * width, 'S'
+                    for i in range(w - 1):
+                        yield first + i, 'E'
+            split = ~finished
+            top, left = top[split], left[split]
+            region_width = region_width[split]
+            region_height = region_height[split]
+            n = len(top)
+            if not n:
+                break
+
+            choice = rng.random_sample((3, n))
+            horizontal = (region_width < region_height) |\
+                ((region_width == region_height) & (choice[0] < 0.5))
+
+            # Walls between rows wall_row and wall_row + 1
+            h = numpy.flatnonzero(horizontal)
+            h_top, h_left = top[h], left[h]
+            h_width, h_height = region_width[h], region_height[h]
+            wall_row = h_top + (choice[1, h] * (h_height - 1)).astype(
+                numpy.intp)
+            cells = _ranges(wall_row * width + h_left, h_width, 1)
+            walls[cells] &= not_s
+            walls[cells + width] &= not_n
+            h_gaps = wall_row * width + h_left +\
+                (choice[2, h] * h_width).astype(numpy.intp)
+            walls[h_gaps] |= G.S
+            walls[h_gaps + width] |= G.N
+
+            # Walls between columns wall_col and wall_col + 1
+            v = numpy.flatnonzero(~horizontal)
+            v_top, v_left = top[v], left[v]
+            v_width, v_height = region_width[v], region_height[v]
+            wall_col = v_left + (choice[1, v] * (v_width - 1)).astype(
+                numpy.intp)
+            cells = _ranges(v_top * width + wall_col, v_height, width)
+            walls[cells] &= not_e
+            walls[cells + 1] &= not_w
+            v_gaps = (v_top + (choice[2, v] * v_height).astype(
+                    numpy.intp)) * width + wall_col
+            walls[v_gaps] |= G.E
+            walls[v_gaps + 1] |= G.W
+
+            if report:
+                for cell in h_gaps:
+                    yield int(cell), 'S'
+                for cell in v_gaps:
+                    yield int(cell), 'E'
+
+            top = numpy.concatenate((h_top, wall_row + 1, v_top, v_top))
+            left = numpy.concatenate((h_left, h_left, v_left, wall_col + 1))
+            region_width = numpy.concatenate(
+                (h_width, h_width, wall_col - v_left + 1,
+                 v_left + v_width - wall_col - 1))
+            region_height = numpy.concatenate(
+                (wall_row - h_top + 1, h_top + h_height - wall_row - 1,
+                 v_height, v_height))
+
+        self._finishRandom(rng)
+
+    def tiled(self, width, height, seed = None, tile_size = 512,
+              processes = None, algorithm = 'kruskal'):
+        """
+        Create a random maze by generating independent tiles in a pool
+        of worker processes, and stitching them together.
+
+        The tiles are joined by choosing a random spanning tree over
+        the grid of tiles and opening one passage through the border
+        between each pair of tiles joined in the tree.  Since each
+        tile is a perfect maze, so is the result.  Each tile is seeded
+        from the maze seed and its position, so the maze does not
+        depend on the number of processes or on the order in which the
+        tiles finish.
+
+        Args:
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        seed (int) (optional): The seed for the random number
+        generator.
+        tile_size (int) (optional): The width and height of each tile
+                                    (number of cells).
+        processes (int) (optional): The number of worker processes.
+                                    Defaults to the number of CPUs;
+                                    1 generates the tiles in this
+                                    process.
+        algorithm (string) (optional): The name of the generator used
+                                       for each tile, such as 'random'
+                                       or 'kruskal'.
+        """
+        return self._drain(self._carveTiled(width, height, seed, tile_size,
+                                            processes, algorithm, False))
+
+    def _carveTiled(self, width, height, seed = None, tile_size = 512,
+                    processes = None, algorithm = 'kruskal', report = True):
+        if seed is None:
+            seed = random.Random().randint(0, 2 ** 31 - 1)
+        rng = random.Random(seed)
+        tiles_across = (width + tile_size - 1) // tile_size
+        tiles_down = (height + tile_size - 1) // tile_size
+        n_tiles = tiles_across * tiles_down
+        tasks = [ (algorithm, tile_row, tile_col, tile_size, width, height,
+                   _tileSeed(seed, tile_row, tile_col))
+                  for tile_row in range(tiles_down)
+                  for tile_col in range(tiles_across) ]
+
+        walls = bytearray(width * height)
+        self.grid = MazeGrid.MazeGrid(width, height, walls)
+        if processes == 1 or n_tiles == 1:
+            results = (_generateTile(task) for task in tasks)
+            pool = None
         else:
-            raise ValueError('cells are not neighbors')
+            pool = multiprocessing.Pool(processes)
+            results = pool.imap_unordered(_generateTile, tasks)
+        try:
+            for tile_row, tile_col, tile_walls in results:
+                top = tile_row * tile_size
+                left = tile_col * tile_size
+                tile_width = min(tile_size, width - left)
+                for row in range((len(tile_walls) // tile_width)):
+                    first = (top + row) * width + left
+                    walls[first:first + tile_width] =\
+                        tile_walls[row * tile_width:(row + 1) * tile_width]
+                if report:
+                    for event in self._tileEvents(top * width + left,
+                                                  tile_width, tile_walls):
+                        yield event
+        finally:
+            if pool:
+                # Every tile has been received, unless the events were
+                # abandoned part of the way through, in which case the
+                # tiles still being made are not wanted
+                pool.terminate()
+                pool.join()
+
+        # Join the tiles along a random spanning tree of the tile grid
+        borders = [ (tile, tile + 1, 'E') for tile in range(n_tiles)
+                    if tile % tiles_across != tiles_across - 1 ]
+        borders += [ (tile, tile + tiles_across, 'S')
+                     for tile in range(n_tiles - tiles_across) ]
+        rng.shuffle(borders)
+        parent = {}
+        for tile, other, direction in borders:
+            a = self._findSet(parent, tile)
+            b = self._findSet(parent, other)
+            if a == b:
+                continue
+            parent[b] = a
+            tile_row, tile_col = divmod(tile, tiles_across)
+            if direction == 'E':
+                # Open a passage through the vertical border
+                col = (tile_col + 1) * tile_size - 1
+                row = rng.randint(tile_row * tile_size,
+                                  min((tile_row + 1) * tile_size, height) - 1)
+                self.grid.carve(row, col, 'E')
+                if report:
+                    yield self.grid.index(row, col), 'E'
+            else:
+                # Open a passage through the horizontal border
+                row = (tile_row + 1) * tile_size - 1
+                col = rng.randint(tile_col * tile_size,
+                                  min((tile_col + 1) * tile_size, width) - 1)
+                self.grid.carve(row, col, 'S')
+                if report:
+                    yield self.grid.index(row, col), 'S'
+
+        self.start = ( rng.randint(0, height - 1), 0 )
+        self.finish = ( rng.randint(0, height - 1), width - 1 )
+
+    def batch(self, width, height, seeds, algorithm = 'random'):
+        """
+        Create one random maze for each of a list of seeds.
+
+        The mazes are packed one after another into a single bytearray,
+        so maze i occupies walls[i * width * height:(i + 1) * width *
+        height].  A MazeGrid for one of them can be made with
+        MazeGrid.MazeGrid(width, height, walls[first:last]).
+
+        Args:
+        width (int): The width of each maze (number of cells).
+        height (int): The height of each maze (number of cells).
+        seeds (list): The seed for each maze.
+        algorithm (string) (optional): The name of the generator to
+                                       use, such as 'random' or
+                                       'kruskal'.
+
+        Returns:
+        A (walls, starts, finishes) tuple, where starts and finishes
+        are lists of (row, column) tuples, one per maze.
+        """
+        generate = getattr(self, algorithm)
+        n_cells = width * height
+        walls = bytearray(n_cells * len(seeds))
+        starts = []
+        finishes = []
+        for i, seed in enumerate(seeds):
+            grid, start, finish = generate(width, height, seed)
+            walls[i * n_cells:(i + 1) * n_cells] = grid.walls
+            starts.append(start)
+            finishes.append(finish)
+        return walls, starts, finishes
+
+    def carve(self, algorithm, *args):
+        """
+        Run one of the maze generators step by step.
+
+        Returns an iterator of carve events.  Each event is a (cell,
+        direction) tuple, meaning that the wall on the given side
+        ('N', 'E', 'S' or 'W') of the cell with flat index cell has
+        just been opened (see MazeGrid.position).  Generators that
+        work on many cells at once report their passages as each
+        batch is made: binaryTree and sidewinder a row at a time,
+        division a level of regions at a time, and tiled each tile as
+        it arrives, followed by the passages that join the tiles.
+
+        When the iterator is exhausted, the finished maze is available
+        as self.grid, self.start and self.finish.  The generation can
+        be abandoned at any point by not asking for more events.
+
+        Args:
+        algorithm (string): The name of the generator, such as
+                            'random' or 'spiral'.
+        args: The arguments for that generator.
+        """
+        if algorithm == 'line' and args[0] < 1:
+            raise ValueError("length must be >= 1")
+        return getattr(self, '_carve' + algorithm[0].upper() +
+                       algorithm[1:])(*args)
+
+    def _drain(self, events):
+        """
+        Run a carve event iterator to the end, and return the
+        (grid, start, finish) tuple of the finished maze.
+        """
+        collections.deque(events, maxlen=0)
+        return self.grid, self.start, self.finish
+
+    def _tileEvents(self, first, tile_width, tile_walls):
+        """
+        Yield a carve event for every passage inside a tile made for
+        tiled, in row-major order.  first is the flat index, in the
+        whole maze, of the top left cell of the tile.
+        """
+        E, S = MazeGrid.MazeGrid.E, MazeGrid.MazeGrid.S
+        width = self.grid.width
+        for i in range(len(tile_walls)):
+            row, col = divmod(i, tile_width)
+            cell = first + row * width + col
+            if tile_walls[i] & E:
+                yield cell, 'E'
+            if tile_walls[i] & S:
+                yield cell, 'S'
+
+    def _randomEnds(self):
+        """
+        Choose a start point on the left edge and an end point on the
+        right edge of self.grid.
+        """
+        self.start = ( self._random.randint(0, self.grid.height - 1), 0 )
+        self.finish = ( self._random.randint(0, self.grid.height - 1),
+                        self.grid.width - 1 )
+
+    def _openRows(self, walls, north, east, report):
+        """
+        Open the north side of every cell marked in the boolean array
+        north, and the east side of every cell marked in east, along
+        with the matching sides of their neighbors.  If report is
+        True, the rows are opened one at a time, and carve events are
+        yielded for each row as it is done; otherwise the whole grid
+        is opened at once.
+        """
+        N, E, S, W = (MazeGrid.MazeGrid.N, MazeGrid.MazeGrid.E,
+                      MazeGrid.MazeGrid.S, MazeGrid.MazeGrid.W)
+        if not report:
+            walls[north] |= N
+            walls[:-1][north[1:]] |= S
+            walls[east] |= E
+            walls[:, 1:][east[:, :-1]] |= W
+            return
+
+        import numpy
+        width = walls.shape[1]
+        for row in range(walls.shape[0]):
+            walls[row][north[row]] |= N
+            if row > 0:
+                walls[row - 1][north[row]] |= S
+            walls[row][east[row]] |= E
+            walls[row, 1:][east[row, :-1]] |= W
+            first = row * width
+            for col in numpy.flatnonzero(north[row]):
+                yield first + int(col), 'N'
+            for col in numpy.flatnonzero(east[row]):
+                yield first + int(col), 'E'
+
+    def _finishRandom(self, rng):
+        """
+        Choose a start point on the left edge and an end point on the
+        right edge of self.grid, using the NumPy RandomState rng.
+        """
+        self.start = ( int(rng.randint(0, self.grid.height)), 0 )
+        self.finish = ( int(rng.randint(0, self.grid.height)),
+                        self.grid.width - 1 )
+
+    def _createPath(self, first):
+        """
+        Carve a depth-first path through self.grid, starting at the
+        cell with flat index first, yielding a carve event for each
+        passage.
+
+        Cells are handled as flat indices, with the neighbors found by
+        adding precomputed offsets, and the visited cells are marked in
+        a bytearray, so no lists or tuples are built for each step.
+        Uses an explicit stack instead of recursion so that the size
+        of the maze is not limited by the interpreter's recursion
+        limit.  Neighbors are considered in the order north, south,
+        west, east, and one is chosen the same way random.choice
+        would, so a given seed produces the same maze as earlier
+        versions.
+
+        Args:
+        first (int): Flat index of the cell at which to start.
+        """
+        walls = self.grid.walls
+        width = self.grid.width
+        last_col = width - 1
+        last_row = len(self.grid) - width
+        rnd = self._random.random
+        directions = self.directions
+
+        # Indexed by direction: N, E, S, W
+        steps = [ -width, 1, width, -1 ]
+        bits = [ MazeGrid.MazeGrid.N, MazeGrid.MazeGrid.E,
+                 MazeGrid.MazeGrid.S, MazeGrid.MazeGrid.W ]
+        opposite_bits = bits[2:] + bits[:2]
+
+        visited = bytearray(len(self.grid))
+        visited[first] = 1
+        candidates = [ 0, 0, 0, 0 ]
+        stack = array.array('l', [ first ])
+        while stack:
+            cell = stack[-1]
+            n = 0
+            if cell >= width and not visited[cell - width]:
+                candidates[n] = 0
+                n += 1
+            if cell < last_row and not visited[cell + width]:
+                candidates[n] = 2
+                n += 1
+            col = cell % width
+            if col > 0 and not visited[cell - 1]:
+                candidates[n] = 3
+                n += 1
+            if col < last_col and not visited[cell + 1]:
+                candidates[n] = 1
+                n += 1
+            if n == 0:
+                stack.pop()
+                continue
+
+            d = candidates[int(rnd() * n)]
+            next_cell = cell + steps[d]
+            walls[cell] |= bits[d]
+            walls[next_cell] |= opposite_bits[d]
+            visited[next_cell] = 1
+            stack.append(next_cell)
+            yield cell, directions[d]
+
+    def _createPathInPlace(self, cells, width, height, first):
+        """
+        Carve a depth-first path through a buffer of cells, starting
+        at the cell with flat index first.  This makes the same choices
+        as _createPath, but keeps all of its state in the cells: bits
+        0-3 are the open-side flags, bits 4-5 are the direction taken
+        to reach the cell, and bit 6 marks the cell as visited.
+
+        Args:
+        cells: A writable buffer of width * height bytes, all 0.
+        width (int): The width of the maze (number of cells).
+        height (int): The height of the maze (number of cells).
+        first (int): Flat index of the cell at which to start.
+        """
+        last_col = width - 1
+        last_row = (height - 1) * width
+        rnd = self._random.random
+        visited = 0x40
+
+        # Indexed by direction: N, E, S, W
+        steps = [ -width, 1, width, -1 ]
+        bits = [ MazeGrid.MazeGrid.N, MazeGrid.MazeGrid.E,
+                 MazeGrid.MazeGrid.S, MazeGrid.MazeGrid.W ]
+        arrivals = [ visited | (d << 4) | bits[(d + 2) % 4]
+                     for d in range(4) ]
+
+        cells[first] = visited
+        candidates = [ 0, 0, 0, 0 ]
+        cell = first
+        while True:
+            n = 0
+            if cell >= width and not cells[cell - width] & visited:
+                candidates[n] = 0
+                n += 1
+            if cell < last_row and not cells[cell + width] & visited:
+                candidates[n] = 2
+                n += 1
+            col = cell % width
+            if col > 0 and not cells[cell - 1] & visited:
+                candidates[n] = 3
+                n += 1
+            if col < last_col and not cells[cell + 1] & visited:
+                candidates[n] = 1
+                n += 1
+            if n == 0:
+                if cell == first:
+                    break
+                cell -= steps[(cells[cell] >> 4) & 3]
+                continue
+
+            d = candidates[int(rnd() * n)]
+            cells[cell] |= bits[d]
+            cell += steps[d]
+            cells[cell] = arrivals[d]
+
+def _ranges(starts, lengths, stride):
+    """
+    Returns a NumPy array of the flat indices of the cells in a number
+    of runs, one after another.  Run i starts at cell starts[i] and
+    has lengths[i] cells, each stride cells after the one before.
+    """
+    import numpy
+    ends = numpy.cumsum(lengths)
+    steps = numpy.arange(ends[-1] if len(ends) else 0, dtype=numpy.intp) -\
+        numpy.repeat(ends - lengths, lengths)
+    return numpy.repeat(starts, lengths) + steps * stride
+
+def _tileSeed(seed, tile_row, tile_col):
+    """
+    Returns the seed for one tile of a maze made by
+    MazeGenerator.tiled: the first four bytes of a SHA-256 hash of the
+    maze seed and the position of the tile.  Unlike a linear formula
+    in the seed and the position, this gives different mazes
+    unrelated tiles, and the seeds are the same on every platform.
+    """
+    digest = hashlib.sha256('%d %d %d' % (seed, tile_row, tile_col)).digest()
+    return struct.unpack('<I', digest[:4])[0]
+
+def _generateTile(task):
+    """
+    Generate one tile for MazeGenerator.tiled.  This is a module-level
+    function so that it can be sent to worker processes.
+
+    Args:
+    task (tuple): (algorithm, tile_row, tile_col, tile_size, width,
+                  height, seed), where width and height are the
+                  dimensions of the whole maze.
+
+    Returns:
+    A (tile_row, tile_col, walls) tuple, where walls is the bytearray
+    of the tile's cells.
+    """
+    algorithm, tile_row, tile_col, tile_size, width, height, seed = task
+    tile_width = min(tile_size, width - tile_col * tile_size)
+    tile_height = min(tile_size, height - tile_row * tile_size)
+    generator = MazeGenerator()
+    grid = getattr(generator, algorithm)(tile_width, tile_height, seed)[0]
+    return tile_row, tile_col, grid.walls
@@ -0,0 +1,420 @@
+import operator, collections
+
+class GridBase:
+    """
+    The parts of a rectangular grid of maze cells that do not depend
+    on how the cells are stored.
+
+    The open sides of each cell are recorded in the low four bits of
+    its flags (N = 1, E = 2, S = 4, W = 8).  Subclasses store the
+    flags, and provide get, set and cells; everything else is built
+    on those.  The start point, finish point and breadcrumbs are not
+    part of the grid; they are kept by the Maze that owns it.
+    """
+    N = 1
+    E = 2
+    S = 4
+    W = 8
+
+    directions = ['N', 'E', 'S', 'W']
+    bits = { 'N': N,
+             'E': E,
+             'S': S,
+             'W': W
+             }
+    opposite_dir = { 'N': 'S',
+                     'E': 'W',
+                     'S': 'N',
+                     'W': 'E'
+                     }
+    offsets = { 'N': (-1, 0),
+                'E': (0, 1),
+                'S': (1, 0),
+                'W': (0, -1)
+                }
+
+    def __len__(self):
+        """
+        Returns the number of cells in the grid.
+        """
+        return self.width * self.height
+
+    def index(self, row, col):
+        """
+        Returns the flat index of the cell at (row, col).
+        """
+        return row * self.width + col
+
+    def position(self, index):
+        """
+        Returns the (row, column) tuple of the cell with a given flat
+        index.
+        """
+        return divmod(index, self.width)
+
+    def isOpen(self, row, col, direction):
+        """
+        Returns True if the cell at (row, col) is open on the side
+        given by direction ('N', 'E', 'S' or 'W'), False otherwise.
+        """
+        return self.get(row, col) & self.bits[direction] != 0
+
+    def carve(self, row, col, direction):
+        """
+        Open the wall between the cell at (row, col) and its neighbor
+        in the given direction.  Both cells are updated.
+        """
+        d_row, d_col = self.offsets[direction]
+        self.set(row, col, self.get(row, col) | self.bits[direction])
+        row += d_row
+        col += d_col
+        self.set(row, col, self.get(row, col) |
+                 self.bits[self.opposite_dir[direction]])
+
+    def close(self, row, col, direction):
+        """
+        Close the wall between the cell at (row, col) and its neighbor
+        in the given direction.  Both cells are updated.
+        """
+        d_row, d_col = self.offsets[direction]
+        self.set(row, col, self.get(row, col) & ~self.bits[direction])
+        row += d_row
+        col += d_col
+        self.set(row, col, self.get(row, col) &
+                 ~self.bits[self.opposite_dir[direction]])
+
+    def closeFile(self):
+        """
+        Close the file that the grid reads its cells from, if it has
+        one.  Grids held in memory have none, and are not changed.
+        """
+        pass
+
+    def copy(self):
+        """
+        Returns an independent copy of the grid, held in a MazeGrid.
+        """
+        grid = MazeGrid(self.width, self.height, self.cells(0, len(self)))
+        grid.spelling = dict(self.spelling)
+        return grid
+
+class MazeGrid(GridBase):
+    """
+    A rectangular grid of maze cells.
+
+    Each cell is stored as a single byte in a flat bytearray, in
+    row-major order, so cells can be read and changed in place
+    rather than through get and set.
+    """
+    def __init__(self, width, height, walls=None):
+        """
+        Create a new grid in which every cell is closed on all sides.
+
+        Args:
+        width (int): The width of the grid (number of cells).
+        height (int): The height of the grid (number of cells).
+        walls (bytearray) (optional): Existing cell data to wrap,
+                                      one byte per cell in row-major
+                                      order.
+        """
+        if walls is None:
+            walls = bytearray(width * height)
+        elif len(walls) != width * height:
+            raise ValueError("walls must contain width * height cells")
+        self.width = width
+        self.height = height
+        self.walls = walls
+
+        # Text tokens for cells whose spelling in a loaded file
+        # differs from the canonical one (see MazeText)
+        self.spelling = {}
+
+    def get(self, row, col):
+        """
+        Returns the open-side flags of the cell at (row, col).
+        """
+        return self.walls[row * self.width + col]
+
+    def set(self, row, col, flags):
+        """
+        Sets the open-side flags of the cell at (row, col).  Only that
+        cell is changed; see carve for a symmetric update.
+        """
+        self.walls[row * self.width + col] = flags
+
+    def isOpen(self, row, col, direction):
+        """
+        Returns True if the cell at (row, col) is open on the side
+        given by direction ('N', 'E', 'S' or 'W'), False otherwise.
+        """
+        return self.walls[row * self.width + col] & self.bits[direction] != 0
+
+    def carve(self, row, col, direction):
+        """
+        Open the wall between the cell at (row, col) and its neighbor
+        in the given direction.  Both cells are updated.
+        """
+        d_row, d_col = self.offsets[direction]
+        self.walls[row * self.width + col] |= self.bits[direction]
+        self.walls[(row + d_row) * self.width + col + d_col] |=\
+            self.bits[self.opposite_dir[direction]]
+
+    def close(self, row, col, direction):
+        """
+        Close the wall between the cell at (row, col) and its neighbor
+        in the given direction.  Both cells are updated.
+        """
+        d_row, d_col = self.offsets[direction]
+        self.walls[row * self.width + col] &= ~self.bits[direction]
+        self.walls[(row + d_row) * self.width + col + d_col] &=\
+            ~self.bits[self.opposite_dir[direction]]
+
+    def cells(self, first, last):
+        """
+        Returns a bytearray of the open-side flags of the cells with
+        flat indices first up to (but not including) last.
+        """
+        return self.walls[first:last]
+
+class PackedGrid(GridBase):
+    """
+    A grid whose cells are packed two to a byte, in a buffer that
+    belongs to someone else (usually a memory-mapped file).  Cell i is
+    in the low nibble of byte i // 2 if i is even, and in the high
+    nibble if i is odd.  Nothing is copied when the grid is created;
+    cells are unpacked as they are read.
+    """
+    def __init__(self, width, height, buffer, offset=0):
+        """
+        Wrap a buffer of packed cells.
+
+        Args:
+        width (int): The width of the grid (number of cells).
+        height (int): The height of the grid (number of cells).
+        buffer: Any writable buffer, such as a ctypes array over a
+                memory map.  It must hold at least offset +
+                (width * height + 1) // 2 bytes.
+        offset (int) (optional): The position of the first cell in
+                                 the buffer.
+        """
+        self.width = width
+        self.height = height
+        self.spelling = {}
+        self._buffer = buffer
+        self._offset = offset
+
+    def get(self, row, col):
+        """
+        Returns the open-side flags of the cell at (row, col).
+        """
+        index = row * self.width + col
+        byte = self._buffer[self._offset + (index >> 1)]
+        if index & 1:
+            return byte >> 4
+        return byte & 0xf
+
+    def set(self, row, col, flags):
+        """
+        Sets the open-side flags of the cell at (row, col).  Only that
+        cell is changed; see carve for a symmetric update.
+        """
+        index = row * self.width + col
+        position = self._offset + (index >> 1)
+        byte = self._buffer[position]
+        if index & 1:
+            self._buffer[position] = (byte & 0xf) | (flags << 4)
+        else:
+            self._buffer[position] = (byte & 0xf0) | flags
+
+    def cells(self, first, last):
+        """
+        Returns a bytearray of the open-side flags of the cells with
+        flat indices first up to (but not including) last.
+        """
+        start = self._offset + (first >> 1)
+        end = self._offset + ((last + 1) >> 1)
+        cells = unpackNibbles(bytearray(self._buffer[start:end]))
+        skip = first & 1
+        return cells[skip:skip + last - first]
+
+class PagedGrid(GridBase):
+    """
+    A grid whose cells stay in a file (packed two to a byte, as in
+    PackedGrid) and are read in square tiles as they are needed.  The
+    most recently used tiles are kept in memory, up to a fixed number,
+    so a walk through a small part of a huge maze reads only that
+    part.
+
+    Changes made to the grid are kept in memory (the tiles that hold
+    them are never dropped) and are not written back to the file.
+
+    The grid keeps the file open until closeFile is called.  (It is
+    not called close, which closes a wall of the maze.)
+    """
+    def __init__(self, width, height, f, offset=0, tile_size=64,
+                 max_tiles=1024):
+        """
+        Wrap a file of packed cells.
+
+        Args:
+        width (int): The width of the grid (number of cells).
+        height (int): The height of the grid (number of cells).
+        f (file object): The file holding the cells, opened in binary
+                         mode.  The grid keeps it open.
+        offset (int) (optional): The position of the first cell in
+                                 the file.
+        tile_size (int) (optional): The width and height of a tile
+                                    (number of cells).
+        max_tiles (int) (optional): The greatest number of tiles to
+                                    keep in memory.
+        """
+        self.width = width
+        self.height = height
+        self.spelling = {}
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self._file = f
+        self._offset = offset
+        self._tiles = collections.OrderedDict()
+        self._dirty = {}
+        self._last_key = None
+        self._last_tile = None
+
+        # Number of tiles read from the file, for tuning max_tiles
+        self.faults = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.closeFile()
+
+    def closeFile(self):
+        """
+        Close the file that the cells are read from.  After this, only
+        the cells of tiles that are still in memory can be read.  (The
+        grid can also be used in a with statement, which closes the
+        file at the end.)
+        """
+        self._file.close()
+
+    def _tile(self, row, col):
+        """
+        Returns the tile holding the cell at (row, col), and the index
+        of the cell within it.
+        """
+        tile_size = self.tile_size
+        tile_row, tile_row_off = divmod(row, tile_size)
+        tile_col, tile_col_off = divmod(col, tile_size)
+        key = (tile_row, tile_col)
+        tile_width = min(tile_size, self.width - tile_col * tile_size)
+        index = tile_row_off * tile_width + tile_col_off
+        if key == self._last_key:
+            return self._last_tile, index
+
+        tile = self._dirty.get(key)
+        if tile is None:
+            tile = self._tiles.pop(key, None)
+            if tile is None:
+                tile = self._readTile(tile_row, tile_col)
+                self.faults += 1
+            self._tiles[key] = tile
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        self._last_key = key
+        self._last_tile = tile
+        return tile, index
+
+    def _readTile(self, tile_row, tile_col):
+        """
+        Returns a bytearray of the cells of a tile, read from the file
+        one row at a time.
+        """
+        first_row = tile_row * self.tile_size
+        first_col = tile_col * self.tile_size
+        tile_width = min(self.tile_size, self.width - first_col)
+        tile_height = min(self.tile_size, self.height - first_row)
+        tile = bytearray(tile_width * tile_height)
+        for i in range(tile_height):
+            first = (first_row + i) * self.width + first_col
+            tile[i * tile_width:(i + 1) * tile_width] =\
+                self._readCells(first, first + tile_width)
+        return tile
+
+    def _readCells(self, first, last):
+        """
+        Returns a bytearray of the cells with flat indices first up to
+        (but not including) last, as they are in the file.
+        """
+        start = self._offset + (first >> 1)
+        self._file.seek(start)
+        packed = bytearray(self._file.read(self._offset + ((last + 1) >> 1)
+                                           - start))
+        skip = first & 1
+        return unpackNibbles(packed)[skip:skip + last - first]
+
+    def get(self, row, col):
+        """
+        Returns the open-side flags of the cell at (row, col).
+        """
+        tile, index = self._tile(row, col)
+        return tile[index]
+
+    def set(self, row, col, flags):
+        """
+        Sets the open-side flags of the cell at (row, col).  Only that
+        cell is changed; see carve for a symmetric update.
+        """
+        tile, index = self._tile(row, col)
+        tile[index] = flags
+        self._dirty[self._last_key] = tile
+
+    def cells(self, first, last):
+        """
+        Returns a bytearray of the open-side flags of the cells with
+        flat indices first up to (but not including) last.  The cells
+        are read straight from the file, without going through the
+        tiles, so reading the whole grid does not push out the tiles
+        in use.
+        """
+        cells = self._readCells(first, last)
+        for (tile_row, tile_col), tile in self._dirty.items():
+            first_row = tile_row * self.tile_size
+            first_col = tile_col * self.tile_size
+            tile_width = min(self.tile_size, self.width - first_col)
+            for i in range(len(tile) // tile_width):
+                begin = (first_row + i) * self.width + first_col
+                low = max(begin, first)
+                high = min(begin + tile_width, last)
+                if low < high:
+                    cells[low - first:high - first] =\
+                        tile[i * tile_width + low - begin:
+                             i * tile_width + high - begin]
+        return cells
+
+# Translation tables for packing and unpacking nibbles
+_shift_up = bytes(bytearray((c << 4) & 0xff for c in range(256)))
+_low_nibble = bytes(bytearray(c & 0xf for c in range(256)))
+_high_nibble = bytes(bytearray(c >> 4 for c in range(256)))
+
+def packNibbles(cells):
+    """
+    Returns a bytearray holding the low four bits of each byte in
+    cells, two to a byte (the first cell in the low nibble).
+    """
+    low = cells[0::2].translate(_low_nibble)
+    high = cells[1::2].translate(_shift_up)
+    if len(high) < len(low):
+        high.append(0)
+    return bytearray(map(operator.or_, low, high))
+
+def unpackNibbles(packed):
+    """
+    Returns a bytearray with one cell for each nibble of packed (the
+    reverse of packNibbles).  If the number of cells packed was odd,
+    the result has an extra cell at the end.
+    """
+    cells = bytearray(2 * len(packed))
+    cells[0::2] = packed.translate(_low_nibble)
+    cells[1::2] = packed.translate(_high_nibble)
+    return cells
@@ -0,0 +1,416 @@
+"""
+Hierarchical pathfinding (HPA*) for very large mazes.
+
+The maze is divided into square clusters.  Every open passage that
+crosses the border between two clusters is an entrance, and the cells
+on both sides of it are nodes of an abstract graph.  The graph has an
+edge of length 1 across each entrance, and an edge between each pair
+of nodes in the same cluster that are connected inside it, whose
+length is the length of the shortest path between them that stays in
+the cluster.  Those lengths are found once, when the graph is built.
+
+A path is found by searching the abstract graph, which is much smaller
+than the maze, and then finding the cells of the path only inside the
+clusters that it passes through.  The graph can be saved next to the
+maze file, so that it does not have to be built again.
+"""
+import os, sys, array, heapq, struct
+import MazeGrid
+
+# magic, cluster size, width, height, number of nodes, number of
+# edges, size and modification time of the maze file
+_header = struct.Struct('<4s5IQd')
+_magic = b'HPA1'
+
+class HierarchicalPathfinder:
+    """
+    An abstract graph of the clusters of a maze, for finding paths
+    with HPA*.
+
+    Attributes:
+    cluster_size (int): The width and height of a cluster (number of
+                        cells).
+    node_cells: The flat index of the cell of each node.
+    offsets, edge_target, edge_length: The edges, in compressed sparse
+        row form: the edges leaving node u are offsets[u] up to
+        offsets[u + 1], and edge e leads to node edge_target[e] with
+        length edge_length[e].
+    """
+    def __init__(self, grid, cluster_size = 32, _graph = None):
+        """
+        Build the abstract graph of a grid.
+
+        Args:
+        grid (MazeGrid): The cells of the maze.  Only the clusters that
+                         a path passes through are read when finding
+                         it, so this may be a paged grid.
+        cluster_size (int) (optional): The width and height of a
+                                       cluster (number of cells).
+        """
+        self.grid = grid
+        self.width = grid.width
+        self.height = grid.height
+        self.cluster_size = cluster_size
+        self._bits = [ MazeGrid.MazeGrid.bits[d]
+                       for d in MazeGrid.MazeGrid.directions ]
+        if _graph:
+            self.node_cells, self.offsets, self.edge_target,\
+                self.edge_length = _graph
+        else:
+            self._build()
+        self._node = dict((cell, u) for u, cell in enumerate(self.node_cells))
+
+    def __len__(self):
+        """
+        Returns the number of nodes in the abstract graph.
+        """
+        return len(self.node_cells)
+
+    def _build(self):
+        """
+        Find the entrances between the clusters, and the lengths of the
+        paths between the nodes of each cluster.
+        """
+        width = self.width
+        size = self.cluster_size
+
+        # Entrances: open passages leaving each cluster to the east or
+        # south
+        crossings = []
+        for row in range(self.height):
+            cells = self.grid.cells(row * width, (row + 1) * width)
+            for col in range(size - 1, width - 1, size):
+                if cells[col] & MazeGrid.MazeGrid.E:
+                    crossings.append((row * width + col, row * width + col + 1))
+            if row % size == size - 1 and row < self.height - 1:
+                for col in range(width):
+                    if cells[col] & MazeGrid.MazeGrid.S:
+                        crossings.append((row * width + col,
+                                          (row + 1) * width + col))
+
+        # Number the nodes cluster by cluster
+        cells = set()
+        for a, b in crossings:
+            cells.add(a)
+            cells.add(b)
+        self.node_cells = array.array('i', sorted(
+                cells, key=lambda cell: (self._clusterOf(cell), cell)))
+        node = dict((cell, u) for u, cell in enumerate(self.node_cells))
+
+        edges = [ [] for u in self.node_cells ]
+        for a, b in crossings:
+            edges[node[a]].append((node[b], 1))
+            edges[node[b]].append((node[a], 1))
+
+        first = 0
+        while first < len(self.node_cells):
+            cluster = self._clusterOf(self.node_cells[first])
+            last = first
+            while last < len(self.node_cells) and\
+                    self._clusterOf(self.node_cells[last]) == cluster:
+                last += 1
+            local = self._cluster(cluster)
+            for u in range(first, last):
+                distance = self._search(local, self.node_cells[u])[0]
+                for v in range(first, last):
+                    d = distance.get(self.node_cells[v])
+                    if v != u and d is not None:
+                        edges[u].append((v, d))
+            first = last
+
+        self.offsets = array.array('i', [ 0 ])
+        self.edge_target = array.array('i')
+        self.edge_length = array.array('i')
+        for node_edges in edges:
+            for v, d in node_edges:
+                self.edge_target.append(v)
+                self.edge_length.append(d)
+            self.offsets.append(len(self.edge_target))
+
+    def _clusterOf(self, cell):
+        """
+        Returns the (row, column) of the cluster holding a cell.
+        """
+        row, col = divmod(cell, self.width)
+        return row // self.cluster_size, col // self.cluster_size
+
+    def _cluster(self, cluster):
+        """
+        Returns the cells of a cluster, as a (first_row, first_col,
+        width, height, cells) tuple, where cells is a bytearray of the
+        cluster's cells in row-major order.
+        """
+        size = self.cluster_size
+        first_row = cluster[0] * size
+        first_col = cluster[1] * size
+        width = min(size, self.width - first_col)
+        height = min(size, self.height - first_row)
+        cells = bytearray()
+        for row in range(first_row, first_row + height):
+            first = row * self.width + first_col
+            cells += self.grid.cells(first, first + width)
+        return first_row, first_col, width, height, cells
+
+    def _search(self, local, source):
+        """
+        Breadth-first search from a cell, without leaving its cluster.
+
+        Args:
+        local (tuple): The cluster, as returned by _cluster.
+        source (int): Flat index of the starting cell.
+
+        Returns:
+        A (distance, parent) tuple of dictionaries, keyed on the flat
+        indices of the cells reached.
+        """
+        first_row, first_col, width, height, cells = local
+        bits = self._bits
+        steps = [ (-1, 0), (0, 1), (1, 0), (0, -1) ]
+        row, col = divmod(source, self.width)
+        distance = { source: 0 }
+        parent = { source: None }
+        queue = [ (row - first_row, col - first_col) ]
+        for row, col in queue:
+            cell = (row + first_row) * self.width + col + first_col
+            flags = cells[row * width + col]
+            d = distance[cell] + 1
+            for direction in range(4):
+                if not flags & bits[direction]:
+                    continue
+                next_row = row + steps[direction][0]
+                next_col = col + steps[direction][1]
+                if 0 <= next_row < height and 0 <= next_col < width:
+                    next_cell = (next_row + first_row) * self.width +\
+                        next_col + first_col
+                    if next_cell not in distance:
+                        distance[next_cell] = d
+                        parent[next_cell] = cell
+                        queue.append((next_row, next_col))
+        return distance, parent
+
+    def path(self, source, target):
+        """
+        Find a shortest path between two cells.
+
+        Args:
+        source (int): Flat index of the cell at which the path starts.
+        target (int): Flat index of the cell at which the path ends.
+
+        Returns:
+        An array of the flat indices of the cells along the path, or
+        None if the target cannot be reached.
+        """
+        found = self._abstractPath(source, target)
+        if found is None:
+            return None
+        from_source, to_target, nodes = found
+        if not nodes:
+            return self._trace(from_source[1], source, target)
+
+        # Refine the abstract path, one cluster at a time
+        path = self._trace(from_source[1], source, nodes[0])
+        for a, b in zip(nodes[:-1], nodes[1:]):
+            path.extend(self._refine(a, b)[1:])
+        tail = self._trace(to_target[1], target, nodes[-1])
+        tail.reverse()
+        path.extend(tail[1:])
+        return path
+
+    def firstStep(self, source, target):
+        """
+        Find the first step of a shortest path between two cells.  Only
+        the first part of the abstract path is refined, so this is
+        much faster than path when the path is long.
+
+        Args:
+        source (int): Flat index of the cell at which the path starts.
+        target (int): Flat index of the cell at which the path ends.
+
+        Returns:
+        The flat index of the next cell on the path, or None if the
+        target cannot be reached or is the source itself.
+        """
+        if source == target:
+            return None
+        found = self._abstractPath(source, target)
+        if found is None:
+            return None
+        from_source, to_target, nodes = found
+        if not nodes:
+            return self._trace(from_source[1], source, target)[1]
+        if source != nodes[0]:
+            return self._trace(from_source[1], source, nodes[0])[1]
+        if len(nodes) > 1:
+            return self._refine(nodes[0], nodes[1])[1]
+        return self._trace(to_target[1], target, nodes[0])[-2]
+
+    def _abstractPath(self, source, target):
+        """
+        Search the abstract graph for a shortest path between two
+        cells, with A*.  The cells are first connected to the nodes of
+        their clusters by searching inside those clusters.
+
+        Returns:
+        None if the target cannot be reached.  Otherwise, a
+        (from_source, to_target, nodes) tuple, where from_source and
+        to_target are the searches (as returned by _search) from the
+        source and the target inside their clusters, and nodes lists
+        the cells of the nodes along the path.  If the shortest path
+        stays inside the source's cluster, nodes is empty.
+        """
+        source_cluster = self._clusterOf(source)
+        target_cluster = self._clusterOf(target)
+        source_local = self._cluster(source_cluster)
+        if target_cluster == source_cluster:
+            target_local = source_local
+        else:
+            target_local = self._cluster(target_cluster)
+        from_source = self._search(source_local, source)
+        to_target = self._search(target_local, target)
+
+        # A path that stays in one cluster is a candidate, but there
+        # may be a shorter one through the neighboring clusters
+        best = None
+        if target in from_source[0]:
+            best = (from_source[0][target], None)
+
+        goals = {}
+        for cell, d in to_target[0].items():
+            if cell in self._node:
+                goals[self._node[cell]] = d
+
+        target_row, target_col = divmod(target, self.width)
+        def estimate(u):
+            row, col = divmod(self.node_cells[u], self.width)
+            return abs(row - target_row) + abs(col - target_col)
+
+        distance = {}
+        parent = {}
+        heap = []
+        for cell, d in from_source[0].items():
+            u = self._node.get(cell)
+            if u is not None:
+                distance[u] = d
+                parent[u] = None
+                heapq.heappush(heap, (d + estimate(u), u))
+        while heap:
+            f, u = heapq.heappop(heap)
+            if best is not None and f >= best[0]:
+                break
+            d = distance[u]
+            if f > d + estimate(u):
+                continue
+            if u in goals and (best is None or d + goals[u] < best[0]):
+                best = (d + goals[u], u)
+            for e in xrange(self.offsets[u], self.offsets[u + 1]):
+                v = self.edge_target[e]
+                dv = d + self.edge_length[e]
+                if dv < distance.get(v, dv + 1):
+                    distance[v] = dv
+                    parent[v] = u
+                    heapq.heappush(heap, (dv + estimate(v), v))
+        if best is None:
+            return None
+
+        nodes = []
+        u = best[1]
+        while u is not None:
+            nodes.append(self.node_cells[u])
+            u = parent[u]
+        nodes.reverse()
+        return from_source, to_target, nodes
+
+    def _refine(self, a, b):
+        """
+        Returns the cells of the path between two consecutive nodes of
+        an abstract path: either the two sides of an entrance, or two
+        nodes of the same cluster.
+        """
+        cluster = self._clusterOf(a)
+        if cluster != self._clusterOf(b):
+            return array.array('i', [ a, b ])
+        parent = self._search(self._cluster(cluster), a)[1]
+        return self._trace(parent, a, b)
+
+    def _trace(self, parent, source, target):
+        """
+        Returns the path from source to target, found by following the
+        parent links of a search from source back from target.
+        """
+        path = array.array('i', [ target ])
+        while target != source:
+            target = parent[target]
+            path.append(target)
+        path.reverse()
+        return path
+
+    def save(self, filename, maze_filename = None):
+        """
+        Save the abstract graph to a file.
+
+        Args:
+        filename (string): The name of the file to write.
+        maze_filename (string) (optional): The file holding the maze.
+                                           Its size and modification
+                                           time are recorded, so that
+                                           load can tell if the maze has
+                                           changed since.
+        """
+        size, mtime = _stamp(maze_filename)
+        with open(filename, 'wb') as f:
+            f.write(_header.pack(_magic, self.cluster_size, self.width,
+                                 self.height, len(self.node_cells),
+                                 len(self.edge_target), size, mtime))
+            for values in [ self.node_cells, self.offsets, self.edge_target,
+                            self.edge_length ]:
+                if sys.byteorder == 'big':
+                    values = array.array('i', values)
+                    values.byteswap()
+                values.tofile(f)
+
+def load(filename, grid, maze_filename = None):
+    """
+    Load an abstract graph saved with HierarchicalPathfinder.save.
+
+    Args:
+    filename (string): The name of the file holding the graph.
+    grid (MazeGrid): The cells of the maze.
+    maze_filename (string) (optional): The file holding the maze, if
+                                       one was given to save.
+
+    Returns:
+    A HierarchicalPathfinder, or None if the file does not exist or
+    does not match the maze.
+    """
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as f:
+        data = f.read(_header.size)
+        if len(data) < _header.size:
+            return None
+        magic, cluster_size, width, height, n_nodes, n_edges, size, mtime =\
+            _header.unpack(data)
+        if magic != _magic or (width, height) != (grid.width, grid.height) or\
+                (size, mtime) != _stamp(maze_filename):
+            return None
+        graph = []
+        for n in [ n_nodes, n_nodes + 1, n_edges, n_edges ]:
+            values = array.array('i')
+            try:
+                values.fromfile(f, n)
+            except EOFError:
+                return None
+            if sys.byteorder == 'big':
+                values.byteswap()
+            graph.append(values)
+    return HierarchicalPathfinder(grid, cluster_size, graph)
+
+def _stamp(filename):
+    """
+    Returns the (size, modification time) of a file, or (0, 0) if no
+    file is given.
+    """
+    if not filename:
+        return 0, 0.0
+    info = os.stat(filename)
+    return info.st_size, info.st_mtime
@@ -0,0 +1,337 @@
+import array, heapq
+import MazeGrid
+
+def _checkSymmetric(cells):
+    """
+    Raise ValueError unless every open side of a cell leads to a
+    neighbor that is open on the opposite side.
+
+    Args:
+    cells (numpy.ndarray): The flags of the cells, with one row of
+                           the array for each row of the maze.
+    """
+    N, E, S, W = (MazeGrid.MazeGrid.N, MazeGrid.MazeGrid.E,
+                  MazeGrid.MazeGrid.S, MazeGrid.MazeGrid.W)
+    east = (cells[:, :-1] & E) != 0
+    west = (cells[:, 1:] & W) != 0
+    south = (cells[:-1, :] & S) != 0
+    north = (cells[1:, :] & N) != 0
+    if (east != west).any() or (south != north).any() or\
+            (cells[:, -1] & E).any() or (cells[:, 0] & W).any() or\
+            (cells[-1, :] & S).any() or (cells[0, :] & N).any():
+        raise ValueError("the walls of the maze are not symmetric: some "
+                         "cell is open on a side where its neighbor is "
+                         "closed, or on the edge of the maze")
+
+class JunctionGraph:
+    """
+    The passages of a maze, with every corridor contracted to a single
+    weighted edge.
+
+    The nodes of the graph are the cells that do not have exactly two
+    open sides: junctions, dead ends and closed cells (plus one cell
+    of each loop that has no junction on it).  Every other cell lies
+    on a corridor between two nodes.  Each corridor gives an edge in
+    each direction, whose weight is its length in steps.  In the mazes
+    made by MazeGenerator.random, most cells are corridor cells, so
+    the graph is much smaller than the grid.
+
+    Cells are identified by flat index (row * width + column), and
+    directions by number (0 = north, 1 = east, 2 = south, 3 = west).
+
+    Attributes:
+    node_cells: The flat index of the cell of each node.
+    offsets, edge_target, edge_length, edge_direction: The edges, in
+        compressed sparse row form: the edges leaving node u are
+        offsets[u] up to offsets[u + 1], and edge e leads to node
+        edge_target[e], edge_length[e] steps away, leaving u in
+        direction edge_direction[e].
+
+    The graph is not updated if the grid changes afterwards; create a
+    new one instead (Maze.getJunctions does this automatically).
+    """
+    def __init__(self, grid):
+        """
+        Build the graph of a grid.
+
+        Args:
+        grid (MazeGrid): The cells of the maze.
+
+        Raises:
+        ValueError: If a cell is open on a side where its neighbor is
+                    closed, or on the edge of the maze, since the
+                    corridors could not then be followed.
+        """
+        import numpy
+        self.width = grid.width
+        self.height = grid.height
+        n_cells = len(grid)
+        self._walls = walls = bytearray(grid.cells(0, n_cells))
+        self._steps = [ -self.width, 1, self.width, -1 ]
+        self._bits = [ MazeGrid.MazeGrid.bits[d]
+                       for d in MazeGrid.MazeGrid.directions ]
+
+        # The direction of the only open side of a cell, indexed by its
+        # flags
+        self._exit = [ -1 ] * 16
+        for d, bit in enumerate(self._bits):
+            self._exit[bit] = d
+
+        popcount = numpy.array([ bin(flags).count('1')
+                                 for flags in range(16) ], dtype=numpy.uint8)
+        cells = numpy.frombuffer(bytes(walls), dtype=numpy.uint8) & 0xf
+        _checkSymmetric(cells.reshape(self.height, self.width))
+        nodes = numpy.nonzero(popcount[cells] != 2)[0].astype(numpy.int32)
+
+        self.node_cells = array.array('i', nodes.tostring())
+        self._node = array.array('i', [-1]) * n_cells
+        numpy.frombuffer(self._node, dtype=numpy.int32)[nodes] =\
+            numpy.arange(len(nodes), dtype=numpy.int32)
+
+        # For each corridor cell: the edge whose corridor it is on, its
+        # distance from the start of that edge, and the direction
+        # along the edge
+        self._corridor_edge = array.array('i', [-1]) * n_cells
+        self._corridor_step = array.array('i', [0]) * n_cells
+        self._corridor_dir = bytearray(n_cells)
+
+        self.offsets = array.array('i', [ 0 ])
+        self.edge_source = array.array('i')
+        self.edge_target = array.array('i')
+        self.edge_length = array.array('i')
+        self.edge_direction = bytearray()
+        for u in xrange(len(nodes)):
+            self._addEdges(u)
+
+        # Corridor cells that no edge reached are on loops without any
+        # node; make one cell of each loop a node
+        corridor_edge = numpy.frombuffer(self._corridor_edge,
+                                         dtype=numpy.int32)
+        node = numpy.frombuffer(self._node, dtype=numpy.int32)
+        for cell in numpy.nonzero((corridor_edge < 0) & (node < 0))[0]:
+            if self._corridor_edge[cell] < 0:
+                self._node[cell] = len(self.node_cells)
+                self.node_cells.append(cell)
+                self._addEdges(len(self.node_cells) - 1)
+
+    def __len__(self):
+        """
+        Returns the number of nodes in the graph.
+        """
+        return len(self.node_cells)
+
+    def _addEdges(self, u):
+        """
+        Add the edges leaving node u, following each corridor to its
+        end and recording the cells along it.
+        """
+        walls = self._walls
+        node = self._node
+        steps = self._steps
+        bits = self._bits
+        exits = self._exit
+        corridor_edge = self._corridor_edge
+        corridor_step = self._corridor_step
+        corridor_dir = self._corridor_dir
+
+        start = self.node_cells[u]
+        for d in range(4):
+            if not walls[start] & bits[d]:
+                continue
+            e = len(self.edge_target)
+            cell = start + steps[d]
+            reverse = corridor_edge[cell]
+            if node[cell] < 0 and reverse >= 0:
+                # The corridor was already followed from its other end
+                target = self.edge_source[reverse]
+                length = self.edge_length[reverse]
+            else:
+                length = 1
+                direction = d
+                while node[cell] < 0:
+                    corridor_edge[cell] = e
+                    corridor_step[cell] = length
+                    direction = exits[walls[cell] &
+                                      ~bits[(direction + 2) % 4]]
+                    corridor_dir[cell] = direction
+                    cell += steps[direction]
+                    length += 1
+                target = node[cell]
+            self.edge_source.append(u)
+            self.edge_target.append(target)
+            self.edge_length.append(length)
+            self.edge_direction.append(d)
+        self.offsets.append(len(self.edge_target))
+
+    def isNode(self, cell):
+        """
+        Returns True if a cell is a node of the graph, False if it is on
+        a corridor.
+        """
+        return self._node[cell] >= 0
+
+    def nextJunction(self, cell, direction):
+        """
+        Find the first node reached by leaving a cell in a given
+        direction and following the corridor, without walking along it.
+
+        Args:
+        cell (int): Flat index of the starting cell.
+        direction (int): The direction in which to leave the cell.
+
+        Returns:
+        A (cell, steps) tuple giving the flat index of the node reached
+        and the number of steps to it, or None if the cell is closed in
+        that direction.
+        """
+        if not self._walls[cell] & self._bits[direction]:
+            return None
+        u = self._node[cell]
+        if u >= 0:
+            for e in xrange(self.offsets[u], self.offsets[u + 1]):
+                if self.edge_direction[e] == direction:
+                    return (self.node_cells[self.edge_target[e]],
+                            self.edge_length[e])
+        e = self._corridor_edge[cell]
+        step = self._corridor_step[cell]
+        if self._corridor_dir[cell] == direction:
+            return (self.node_cells[self.edge_target[e]],
+                    self.edge_length[e] - step)
+        return self.node_cells[self.edge_source[e]], step
+
+    def edgeCells(self, e):
+        """
+        Returns an array of the flat indices of the cells along edge e,
+        from its source node to its target node inclusive.
+        """
+        return self._walk(self.node_cells[self.edge_source[e]],
+                          self.edge_direction[e])
+
+    def path(self, source, target):
+        """
+        Find a shortest path between two cells, with Dijkstra's
+        algorithm over the graph.  Either cell may be on a corridor.
+
+        Args:
+        source (int): Flat index of the cell at which the path starts.
+        target (int): Flat index of the cell at which the path ends.
+
+        Returns:
+        An array of the flat indices of the cells along the path, or
+        None if the target cannot be reached.
+        """
+        if source == target:
+            return array.array('i', [ source ])
+
+        # The nodes at which the search starts and ends, with the
+        # distance and the direction from (or to) the cell
+        starts = self._ends(source)
+        finishes = {}
+        for u, steps, direction in self._ends(target):
+            if u not in finishes or steps < finishes[u][0]:
+                finishes[u] = (steps, direction)
+
+        best = None
+        if not self.isNode(source) and\
+                self._corridor_edge[source] == self._corridor_edge[target]:
+            # Both cells are on the same corridor
+            step = self._corridor_step[source]
+            target_step = self._corridor_step[target]
+            if target_step > step:
+                direction = self._corridor_dir[source]
+            else:
+                direction = self._backward(source)
+            best = (abs(target_step - step), None, direction)
+
+        distance = {}
+        parent = {}
+        heap = []
+        for u, steps, direction in starts:
+            if steps < distance.get(u, steps + 1):
+                distance[u] = steps
+                parent[u] = (None, direction)
+                heapq.heappush(heap, (steps, u))
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > distance[u]:
+                continue
+            if best is not None and d >= best[0]:
+                break
+            if u in finishes:
+                steps, direction = finishes[u]
+                if best is None or d + steps < best[0]:
+                    best = (d + steps, u, direction)
+            for e in xrange(self.offsets[u], self.offsets[u + 1]):
+                v = self.edge_target[e]
+                dv = d + self.edge_length[e]
+                if dv < distance.get(v, dv + 1):
+                    distance[v] = dv
+                    parent[v] = (u, e)
+                    heapq.heappush(heap, (dv, v))
+        if best is None:
+            return None
+
+        length, last, direction = best
+        if last is None:
+            return self._walk(source, direction, length)
+
+        # Trace the edges back to the first node, then build the path
+        # from the pieces of corridor
+        edges = []
+        u = last
+        while parent[u][0] is not None:
+            edges.append(parent[u][1])
+            u = parent[u][0]
+        first_direction = parent[u][1]
+        path = array.array('i', [ source ])
+        if source != self.node_cells[u]:
+            path = self._walk(source, first_direction)
+        for e in reversed(edges):
+            path.extend(self.edgeCells(e)[1:])
+        if target != self.node_cells[last]:
+            tail = self._walk(target, direction, finishes[last][0])
+            tail.reverse()
+            path.extend(tail[1:])
+        return path
+
+    def _ends(self, cell):
+        """
+        Returns the nodes nearest to a cell, as a list of (node, steps,
+        direction) tuples, where direction is the way out of the cell
+        toward the node.  A node is its own nearest node.
+        """
+        u = self._node[cell]
+        if u >= 0:
+            return [ (u, 0, None) ]
+        e = self._corridor_edge[cell]
+        step = self._corridor_step[cell]
+        return [ (self.edge_source[e], step, self._backward(cell)),
+                 (self.edge_target[e], self.edge_length[e] - step,
+                  self._corridor_dir[cell]) ]
+
+    def _backward(self, cell):
+        """
+        Returns the direction from a corridor cell back toward the
+        source of its edge.
+        """
+        forward = self._bits[self._corridor_dir[cell]]
+        return self._exit[self._walls[cell] & ~forward & 0xf]
+
+    def _walk(self, cell, direction, steps=None):
+        """
+        Returns an array of the cells passed by leaving a cell in a
+        given direction and following the corridor, up to the next
+        node or for a given number of steps.  The array starts with
+        the cell itself.
+        """
+        walls = self._walls
+        node = self._node
+        path = array.array('i', [ cell ])
+        cell += self._steps[direction]
+        path.append(cell)
+        while (node[cell] < 0 if steps is None else len(path) <= steps):
+            direction = self._exit[walls[cell] &
+                                   ~self._bits[(direction + 2) % 4]]
+            cell += self._steps[direction]
+            path.append(cell)
+        return path
@@ -0,0 +1,323 @@
+import array, heapq
+import MazeGrid
+
+# Frontiers with at least this many cells are expanded with NumPy; for
+# smaller ones, the fixed cost of each NumPy call outweighs the work
+_vector_frontier = 256
+
+def _passages(cells, width, height):
+    """
+    Returns the flags of the cells with only their passages kept: the
+    sides that are open in both of the cells they separate.  A side
+    that is open on only one of its cells, or on the edge of the maze,
+    is treated as a wall, as it is when the player moves.
+
+    Args:
+    cells (numpy.ndarray): The flags of the cells, in row-major order.
+    width (int): The width of the maze.
+    height (int): The height of the maze.
+
+    Returns:
+    A NumPy array of uint8 with the same shape as cells.
+    """
+    import numpy
+    N, E, S, W = (MazeGrid.MazeGrid.N, MazeGrid.MazeGrid.E,
+                  MazeGrid.MazeGrid.S, MazeGrid.MazeGrid.W)
+    grid = cells.reshape(height, width)
+    passages = numpy.zeros((height, width), dtype=numpy.uint8)
+    east = ((grid[:, :-1] & E) != 0) & ((grid[:, 1:] & W) != 0)
+    passages[:, :-1] |= east * numpy.uint8(E)
+    passages[:, 1:] |= east * numpy.uint8(W)
+    south = ((grid[:-1, :] & S) != 0) & ((grid[1:, :] & N) != 0)
+    passages[:-1, :] |= south * numpy.uint8(S)
+    passages[1:, :] |= south * numpy.uint8(N)
+    return passages.reshape(-1)
+
+class MazeSolver:
+    """
+    Shortest-path search over the passages of a maze.
+
+    The passages are indexed once, when the solver is created, in
+    compressed sparse row (CSR) form: the neighbors of the cell with
+    flat index i are neighbors[offsets[i]:offsets[i + 1]], in the
+    order north, east, south, west.  The searches then run on these
+    flat arrays, and return paths as arrays of flat cell indices
+    (row * width + column), from the source to the target inclusive.
+
+    Only sides that are open in both of the cells they separate count
+    as passages (see _passages), so that every move can be made both
+    ways and never leaves the maze.
+
+    The index is not updated if the grid changes afterwards; create a
+    new solver instead (Maze.getSolver does this automatically).
+    """
+    def __init__(self, grid):
+        """
+        Index the passages of a grid.
+
+        Args:
+        grid (MazeGrid): The cells of the maze.
+        """
+        import numpy
+        self.width = grid.width
+        self.height = grid.height
+        n_cells = len(grid)
+        walls = _passages(numpy.frombuffer(bytes(grid.cells(0, n_cells)),
+                                           dtype=numpy.uint8),
+                          self.width, self.height)
+
+        # Number of open sides of each combination of flags
+        popcount = numpy.array([ bin(flags).count('1')
+                                 for flags in range(16) ], dtype=numpy.uint8)
+        offsets = numpy.zeros(n_cells + 1, dtype=numpy.int32)
+        numpy.cumsum(popcount[walls], out=offsets[1:])
+        neighbors = numpy.empty(offsets[-1], dtype=numpy.int32)
+
+        # For each direction, the neighbor goes after those in the
+        # directions with lower bits
+        cells = numpy.arange(n_cells, dtype=numpy.int32)
+        for bit, step in [ (MazeGrid.MazeGrid.N, -self.width),
+                           (MazeGrid.MazeGrid.E, 1),
+                           (MazeGrid.MazeGrid.S, self.width),
+                           (MazeGrid.MazeGrid.W, -1) ]:
+            is_open = (walls & bit) != 0
+            open_cells = cells[is_open]
+            rank = popcount[walls[is_open] & (bit - 1)]
+            neighbors[offsets[open_cells] + rank] = open_cells + step
+
+        # Plain arrays are much faster than NumPy arrays to index one
+        # element at a time, as the searches do
+        self.offsets = array.array('i', offsets.tostring())
+        self.neighbors = array.array('i', neighbors.tostring())
+
+        # The flags themselves, for expanding whole frontiers at once
+        self.walls = walls
+
+    def __len__(self):
+        """
+        Returns the number of cells in the maze.
+        """
+        return self.width * self.height
+
+    def bfs(self, source, target):
+        """
+        Find a shortest path with breadth-first search.
+
+        Args:
+        source (int): Flat index of the cell at which the path starts.
+        target (int): Flat index of the cell at which the path ends.
+
+        Returns:
+        An array of the flat indices of the cells along the path, or
+        None if the target cannot be reached.
+        """
+        offsets = self.offsets
+        neighbors = self.neighbors
+        parent = array.array('i', [-1]) * len(self)
+        parent[source] = source
+        queue = array.array('i', [ source ])
+        append = queue.append
+        head = 0
+        while head < len(queue):
+            cell = queue[head]
+            head += 1
+            if cell == target:
+                return self._tracePath(parent, source, target)
+            for neighbor in neighbors[offsets[cell]:offsets[cell + 1]]:
+                if parent[neighbor] < 0:
+                    parent[neighbor] = cell
+                    append(neighbor)
+        return None
+
+    def bidirectional(self, source, target):
+        """
+        Find a shortest path with bidirectional breadth-first search,
+        growing one level at a time from whichever end has the smaller
+        frontier until the two searches meet.
+
+        Args:
+        source (int): Flat index of the cell at which the path starts.
+        target (int): Flat index of the cell at which the path ends.
+
+        Returns:
+        An array of the flat indices of the cells along the path, or
+        None if the target cannot be reached.
+        """
+        offsets = self.offsets
+        neighbors = self.neighbors
+        forward = array.array('i', [-1]) * len(self)
+        backward = array.array('i', [-1]) * len(self)
+        forward[source] = 0
+        backward[target] = 0
+        if source == target:
+            return array.array('i', [ source ])
+        forward_frontier = [ source ]
+        backward_frontier = [ target ]
+
+        while forward_frontier and backward_frontier:
+            if len(forward_frontier) <= len(backward_frontier):
+                frontier, distance, other = forward_frontier, forward, backward
+            else:
+                frontier, distance, other = backward_frontier, backward,\
+                    forward
+
+            # Finish the whole level before stopping, so that the
+            # shortest of the paths found through it is chosen
+            next_frontier = []
+            append = next_frontier.append
+            best = None
+            for cell in frontier:
+                d = distance[cell] + 1
+                for neighbor in neighbors[offsets[cell]:offsets[cell + 1]]:
+                    if distance[neighbor] < 0:
+                        distance[neighbor] = d
+                        append(neighbor)
+                        if other[neighbor] >= 0 and\
+                                (best is None or
+                                 other[neighbor] < other[best]):
+                            best = neighbor
+            if best is not None:
+                path = self._descend(forward, best)
+                path.reverse()
+                path.extend(self._descend(backward, best)[1:])
+                return path
+
+            if frontier is forward_frontier:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+        return None
+
+    def astar(self, source, target):
+        """
+        Find a shortest path with A* search, using the Manhattan
+        distance to the target as the heuristic.
+
+        Args:
+        source (int): Flat index of the cell at which the path starts.
+        target (int): Flat index of the cell at which the path ends.
+
+        Returns:
+        An array of the flat indices of the cells along the path, or
+        None if the target cannot be reached.
+        """
+        offsets = self.offsets
+        neighbors = self.neighbors
+        width = self.width
+        target_row, target_col = divmod(target, width)
+        cost = array.array('i', [-1]) * len(self)
+        parent = array.array('i', [-1]) * len(self)
+        cost[source] = 0
+        parent[source] = source
+        # Entries are (estimate, -cost, cell): among cells with the
+        # same estimate, the one furthest from the source is taken
+        # first, which reaches the target after fewer expansions
+        heap = [ (0, 0, source) ]
+        push = heapq.heappush
+        pop = heapq.heappop
+        while heap:
+            estimate, g, cell = pop(heap)
+            if cell == target:
+                return self._tracePath(parent, source, target)
+            g = -g
+            if g > cost[cell]:
+                # A shorter way to this cell was found after this
+                # entry was pushed
+                continue
+            g += 1
+            for neighbor in neighbors[offsets[cell]:offsets[cell + 1]]:
+                if cost[neighbor] < 0 or g < cost[neighbor]:
+                    cost[neighbor] = g
+                    parent[neighbor] = cell
+                    row, col = divmod(neighbor, width)
+                    push(heap, (g + abs(row - target_row) +
+                                abs(col - target_col), -g, neighbor))
+        return None
+
+    def distances(self, target):
+        """
+        Find the length of the shortest path from every cell to a
+        target cell, with breadth-first search.
+
+        The search grows one level at a time.  Large levels are
+        expanded with NumPy, a direction at a time over the whole
+        frontier; small levels (such as those of perfect mazes, where
+        the frontier is often just a few corridors) are expanded cell
+        by cell.  Both work on the same array.
+
+        Args:
+        target (int): Flat index of the target cell.
+
+        Returns:
+        A NumPy array of int32, indexed by flat cell index, holding the
+        number of steps from each cell to the target, or -1 for cells
+        from which the target cannot be reached.
+        """
+        import numpy
+        offsets = self.offsets
+        neighbors = self.neighbors
+        walls = self.walls
+        steps = [ (MazeGrid.MazeGrid.N, -self.width),
+                  (MazeGrid.MazeGrid.E, 1),
+                  (MazeGrid.MazeGrid.S, self.width),
+                  (MazeGrid.MazeGrid.W, -1) ]
+
+        distance = array.array('i', [-1]) * len(self)
+        field = numpy.frombuffer(distance, dtype=numpy.int32)
+        distance[target] = 0
+        frontier = [ target ]
+        d = 0
+        while len(frontier):
+            d += 1
+            if len(frontier) < _vector_frontier:
+                if not isinstance(frontier, list):
+                    frontier = frontier.tolist()
+                next_frontier = []
+                append = next_frontier.append
+                for cell in frontier:
+                    for neighbor in neighbors[offsets[cell]:
+                                              offsets[cell + 1]]:
+                        if distance[neighbor] < 0:
+                            distance[neighbor] = d
+                            append(neighbor)
+                frontier = next_frontier
+            else:
+                frontier = numpy.asarray(frontier, dtype=numpy.int32)
+                reached = []
+                for bit, step in steps:
+                    cells = frontier[(walls[frontier] & bit) != 0] + step
+                    cells = cells[field[cells] < 0]
+                    field[cells] = d
+                    reached.append(cells)
+                frontier = numpy.concatenate(reached)
+        return field
+
+    def _tracePath(self, parent, source, target):
+        """
+        Returns the path from source to target, found by following
+        the parent links back from the target.
+        """
+        path = array.array('i', [ target ])
+        cell = target
+        while cell != source:
+            cell = parent[cell]
+            path.append(cell)
+        path.reverse()
+        return path
+
+    def _descend(self, distance, cell):
+        """
+        Returns the path from a cell back to the start of a search,
+        found by repeatedly stepping to a neighbor one step closer.
+        """
+        offsets = self.offsets
+        neighbors = self.neighbors
+        path = array.array('i', [ cell ])
+        while distance[cell] > 0:
+            d = distance[cell] - 1
+            for neighbor in neighbors[offsets[cell]:offsets[cell + 1]]:
+                if distance[neighbor] == d:
+                    cell = neighbor
+                    break
+            path.append(cell)
+        return path
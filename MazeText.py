@@ -0,0 +1,178 @@
+"""
+Reading and writing mazes in the text format.
+
+Each line of the file is one row of the maze, and each
+whitespace-separated token is one cell.  A token lists the sides of
+the cell that are open ('N', 'E', 'S', 'W'), followed by '^' if the
+cell is the starting point and '$' if it is the end point.  For
+example, 'ES^' is the starting cell, open to the east and south.
+"""
+import collections
+import MazeGrid
+
+# Canonical spelling of each combination of open sides
+_canonical = [ ''.join(d for d in MazeGrid.MazeGrid.directions
+                       if flags & MazeGrid.MazeGrid.bits[d])
+               for flags in range(16) ]
+
+# Open-side flags of each canonical token, and each token followed by
+# the space that separates it from the next
+_canonical_flags = dict((token, flags) for flags, token in enumerate(_canonical))
+_spaced = [ token + ' ' for token in _canonical ]
+
+# Approximate number of cells formatted before each write
+_chunk_cells = 1 << 16
+
+def parseToken(token):
+    """
+    Returns the open-side flags described by a text token.  Characters
+    other than 'N', 'E', 'S' and 'W' are ignored.
+    """
+    flags = 0
+    for c in token:
+        flags |= MazeGrid.MazeGrid.bits.get(c, 0)
+    return flags
+
+def formatCell(flags, start=False, finish=False):
+    """
+    Returns the canonical text token for a cell.
+    """
+    token = _canonical[flags & 0xf]
+    if start:
+        token += '^'
+    if finish:
+        token += '$'
+    return token
+
+def read(f):
+    """
+    Read a maze from a text file.
+
+    Rows are read and checked one at a time, so a malformed file is
+    rejected as soon as the first bad row is reached.  Rows made only
+    of canonical tokens (which is how save writes them) are converted
+    in one step; other rows are parsed token by token.
+
+    Args:
+    f (file object): The file object containing the description of the
+                     maze.
+
+    Returns:
+    A (grid, start, finish, visited) tuple.  start and finish are
+    (row, column) tuples, or None if the file does not mark them.
+    visited is a list of the flat indices of cells marked with '*',
+    with each index repeated once per '*'.
+
+    Raises:
+    ValueError if the rows of the maze are not all the same length.
+    """
+    cells = bytearray()
+    start = None
+    finish = None
+    visited = []
+    spelling = {}
+    width = None
+    row_no = -1
+    for row_no, line in enumerate(f):
+        tokens = line.split()
+        if width is None:
+            width = len(tokens)
+        elif len(tokens) != width:
+            raise ValueError("all rows must be the same length (row {} has "
+                             "{} cells, not {})".format(row_no, len(tokens),
+                                                        width))
+        try:
+            cells += bytearray([ _canonical_flags[c] for c in tokens ])
+            continue
+        except KeyError:
+            pass
+
+        index = row_no * width
+        for col_no, c in enumerate(tokens):
+            if '*' in c:
+                visited.extend([index] * c.count('*'))
+                c = c.replace('*', '')
+            flags = parseToken(c)
+            cells.append(flags)
+            is_start = '^' in c
+            is_finish = '$' in c
+            if is_start:
+                start = (row_no, col_no)
+            if is_finish:
+                finish = (row_no, col_no)
+            if c != formatCell(flags, is_start, is_finish):
+                spelling[index] = c
+            index += 1
+
+    grid = MazeGrid.MazeGrid(width or 0, row_no + 1, cells)
+    grid.spelling = spelling
+    return grid, start, finish, visited
+
+def write(f, grid, start, finish):
+    """
+    Write a maze to a text file.  Cells that were loaded from a file
+    keep the spelling they were loaded with.
+
+    Args:
+    f (file object): The file object to which the maze is written.
+    grid (MazeGrid): The cells of the maze.
+    start (tuple): (row, column) of the starting point.
+    finish (tuple): (row, column) of the end point.
+    """
+    spelled_rows = collections.defaultdict(list)
+    for index, token in grid.spelling.items():
+        row_no, col_no = grid.position(index)
+        spelled_rows[row_no].append((col_no, token))
+
+    def rows():
+        for row_no in range(grid.height):
+            first = grid.index(row_no, 0)
+            yield grid.cells(first, first + grid.width)
+
+    _writeRows(f, rows(), start, finish, spelled_rows)
+
+def writeRows(f, rows, start, finish):
+    """
+    Write a maze to a text file one row at a time, so that the maze
+    never has to be held in memory as a whole.
+
+    Args:
+    f (file object): The file object to which the maze is written.
+    rows (iterable): Yields one sequence of open-side flags per row,
+                     such as the rows from MazeGenerator.ellerRows.
+    start (tuple): (row, column) of the starting point.
+    finish (tuple): (row, column) of the end point.
+    """
+    _writeRows(f, rows, start, finish, {})
+
+def _writeRows(f, rows, start, finish, spelled_rows):
+    """
+    Does the actual work of writing rows of cells, formatting several
+    rows at a time and writing them with a single call.
+
+    Args:
+    f (file object): The file object to which the maze is written.
+    rows (iterable): Yields one sequence of open-side flags per row.
+    start (tuple): (row, column) of the starting point.
+    finish (tuple): (row, column) of the end point.
+    spelled_rows (dict): Maps row numbers to lists of (column, token)
+                         pairs, giving tokens to write in place of the
+                         canonical ones.
+    """
+    lines = []
+    cells = 0
+    for row_no, row in enumerate(rows):
+        tokens = map(_spaced.__getitem__, row)
+        cells += len(tokens)
+        for point, mark in [ (start, '^'), (finish, '$') ]:
+            if point and point[0] == row_no:
+                tokens[point[1]] = tokens[point[1]][:-1] + mark + ' '
+        for col_no, token in spelled_rows.get(row_no, ()):
+            tokens[col_no] = token + ' '
+        tokens.append('\n')
+        lines.append(''.join(tokens))
+        if cells >= _chunk_cells:
+            f.write(''.join(lines))
+            lines = []
+            cells = 0
+    f.write(''.join(lines))
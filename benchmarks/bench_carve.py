@@ -0,0 +1,29 @@
+"""
+Benchmark for the maze generators, in cells carved per second.
+
+Usage:
+python bench_carve.py [size [algorithm ...]]
+"""
+import os, sys, time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+import MazeGenerator
+
+default_algorithms = [ 'random', 'wilson', 'kruskal', 'division', 'eller' ]
+
+def main(size, algorithms):
+    generator = MazeGenerator.MazeGenerator()
+    print '{:<12} {:>15} {:>10} {:>15}'.format('algorithm', 'cells',
+                                               'time (s)', 'cells / s')
+    for algorithm in algorithms:
+        t0 = time.time()
+        getattr(generator, algorithm)(size, size, 0)
+        elapsed = time.time() - t0
+        print '{:<12} {:>15} {:>10.2f} {:>15.0f}'.format(
+            algorithm, size * size, elapsed, size * size / elapsed)
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    main(size, sys.argv[2:] or default_algorithms)
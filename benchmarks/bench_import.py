@@ -0,0 +1,53 @@
+"""
+Benchmark for the time taken to import the Maze module.
+
+Each import is timed in a fresh interpreter.  The import of the
+graphics module, which Maze used to import eagerly, is timed
+separately for comparison; it needs a display, and is reported as
+failed if none is available.
+
+Usage:
+python bench_import.py [repeats]
+"""
+import os, sys, subprocess
+
+package_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+timer = """
+import sys, time
+sys.path.insert(0, {!r})
+t0 = time.time()
+import {}
+print time.time() - t0
+"""
+
+def timeImport(module, repeats):
+    """
+    Returns the best time (in seconds) taken to import a module in a
+    fresh interpreter, or None if the import fails.
+    """
+    best = None
+    with open(os.devnull, 'w') as devnull:
+        for i in range(repeats):
+            p = subprocess.Popen([sys.executable, '-c',
+                                  timer.format(package_dir, module)],
+                                 stdout=subprocess.PIPE, stderr=devnull)
+            out = p.communicate()[0]
+            if p.returncode != 0:
+                return None
+            elapsed = float(out)
+            if best is None or elapsed < best:
+                best = elapsed
+    return best
+
+def main(repeats):
+    print '{:<12} {:>12}'.format('module', 'import (ms)')
+    for module in [ 'Maze', 'graphics' ]:
+        elapsed = timeImport(module, repeats)
+        if elapsed is None:
+            print '{:<12} {:>12}'.format(module, 'failed')
+        else:
+            print '{:<12} {:>12.2f}'.format(module, elapsed * 1000)
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,58 @@
+"""
+Benchmark for MazeGenerator.random.
+
+Generates random mazes of increasing size and reports the time taken
+and the peak resident memory of the process.  Each size is run in a
+separate interpreter so that the peak memory of one run does not hide
+that of the next.
+
+With --file, the mazes are generated with MazeGenerator.randomToFile
+instead, which writes them to a temporary file in the binary format
+rather than keeping them in memory.
+
+Usage:
+python bench_random.py [--file] [size ...]
+"""
+import os, sys, time, resource, subprocess, tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+
+default_sizes = [ 100, 300, 1000, 3000 ]
+
+def run(size, to_file):
+    import MazeGenerator
+    generator = MazeGenerator.MazeGenerator()
+    t0 = time.time()
+    if to_file:
+        fd, filename = tempfile.mkstemp(suffix='.mzb')
+        os.close(fd)
+        try:
+            generator.randomToFile(filename, size, size, 0)
+        finally:
+            os.remove(filename)
+    else:
+        generator.random(size, size, 0)
+    elapsed = time.time() - t0
+    # ru_maxrss is reported in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print '{:>6} x {:<6} {:>12} {:>10.2f} {:>10.1f}'.format(
+        size, size, size * size, elapsed, peak)
+    sys.stdout.flush()
+
+def main(sizes, to_file):
+    print '{:^15} {:>12} {:>10} {:>10}'.format('size', 'cells',
+                                               'time (s)', 'peak (MB)')
+    for size in sizes:
+        subprocess.call([sys.executable, __file__, '--run', str(size)] +
+                        ([ '--file' ] if to_file else []))
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    to_file = '--file' in args
+    if to_file:
+        args.remove('--file')
+    if len(args) > 1 and args[0] == '--run':
+        run(int(args[1]), to_file)
+    else:
+        main([ int(s) for s in args ] or default_sizes, to_file)
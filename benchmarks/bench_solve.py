@@ -0,0 +1,38 @@
+"""
+Benchmark for MazeSolver: the time taken to index a maze and to find
+the path from its start to its end with each search.
+
+The mazes are made with a fast whole-grid generator by default, so
+that large sizes can be tried without waiting for random.
+
+Usage:
+python bench_solve.py [size [algorithm]]
+"""
+import os, sys, time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+import MazeGenerator, MazeSolver
+
+def main(size, algorithm):
+    generator = MazeGenerator.MazeGenerator()
+    grid, start, finish = getattr(generator, algorithm)(size, size, 0)
+    source = grid.index(*start)
+    target = grid.index(*finish)
+    print '{} x {} {} maze ({} cells)'.format(size, size, algorithm,
+                                             size * size)
+
+    t0 = time.time()
+    solver = MazeSolver.MazeSolver(grid)
+    print '{:<15} {:>10.2f}'.format('index', time.time() - t0)
+    for method in [ 'bfs', 'bidirectional', 'astar' ]:
+        t0 = time.time()
+        path = getattr(solver, method)(source, target)
+        print '{:<15} {:>10.2f} {:>12} cells in path'.format(
+            method, time.time() - t0, len(path))
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    algorithm = sys.argv[2] if len(sys.argv) > 2 else 'sidewinder'
+    main(size, algorithm)
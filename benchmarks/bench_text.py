@@ -0,0 +1,41 @@
+"""
+Benchmark for saving and loading mazes in the text format, in cells
+per second.
+
+Usage:
+python bench_text.py [size ...]
+"""
+import os, sys, time, tempfile
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..'))
+import Maze
+
+default_sizes = [ 100, 300, 1000, 2000 ]
+
+def main(sizes):
+    m = Maze.Maze()
+    m.setDraw(False)
+    fd, filename = tempfile.mkstemp(suffix='.txt')
+    os.close(fd)
+    print '{:^15} {:>12} {:>10} {:>15} {:>15}'.format(
+        'size', 'cells', 'MB', 'save cells / s', 'load cells / s')
+    try:
+        for size in sizes:
+            m.random(size, size, 0)
+            t0 = time.time()
+            m.save(filename)
+            save_time = time.time() - t0
+            t0 = time.time()
+            m.load(filename)
+            load_time = time.time() - t0
+            print '{:>6} x {:<6} {:>12} {:>10.1f} {:>15.0f} {:>15.0f}'.format(
+                size, size, size * size,
+                os.path.getsize(filename) / (1024.0 * 1024.0),
+                size * size / save_time, size * size / load_time)
+            sys.stdout.flush()
+    finally:
+        os.remove(filename)
+
+if __name__ == '__main__':
+    main([ int(s) for s in sys.argv[1:] ] or default_sizes)
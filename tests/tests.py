@@ -1,9 +1,19 @@
-import unittest, sys, os, cv2, filecmp, subprocess
+import unittest, sys, os, cv2, filecmp, subprocess, random, shutil, pickle,\
+    StringIO, struct
 sys.path.append('..')
-import Maze
+import Maze, MazeText, MazeGenerator, MazeCache, MazeGrid, MazeArchive,\
+    MazeBinary, MazeSolver, MazeJunctions, MazeHierarchy
 
 class MazeTest(unittest.TestCase):
 
+    def setUp(self):
+        """
+        Create the directory that the tests write their output to, so
+        that each test can run on its own.
+        """
+        if not os.path.exists('output'):
+            os.mkdir('output')
+
     def savepng(self, maze, file_basename):
         """
         A helper method to save a screenshot of the maze and convert
@@ -64,6 +74,8 @@ class MazeTest(unittest.TestCase):
         m.turnRight()
         self.assertTrue(m.moveForward())
         self.assertTrue(m.wasVisited())
+        self.assertEqual(m.getVisitCount(), 1)
+        self.assertEqual(m.getVisitCounts()[0], 3)
 
         self.assertTrue(m.pathIsClear())
         self.assertTrue(m.moveForward())
@@ -133,8 +145,6 @@ class MazeTest(unittest.TestCase):
         """
         input_dir = 'images'
         output_dir = 'output'
-        if not os.path.exists(output_dir):
-            os.mkdir(output_dir)
 
         m = Maze.Maze()
         m.setDraw(True)
@@ -209,6 +219,591 @@ class MazeTest(unittest.TestCase):
         m.save(output_file_visited)
         self.assertTrue(filecmp.cmp(filename, output_file_visited))
 
+        # Generated mazes should survive a save/load round trip
+        output_file_random = os.path.join('output', 'test_maze_random.txt')
+        m.random(15, 10, 0)
+        walls = m._grid.walls
+        start, finish = m.getStart(), m.getFinish()
+        m.save(output_file_random)
+        m.load(output_file_random)
+        self.assertEqual(m._grid.walls, walls)
+        self.assertEqual(m.getStart(), start)
+        self.assertEqual(m.getFinish(), finish)
+
+        # Rows of different lengths are rejected as soon as they are
+        # read
+        lines = iter([ 'ES^ W\n', 'N\n', 'N $\n' ])
+        with self.assertRaises(ValueError):
+            MazeText.read(lines)
+        self.assertEqual(next(lines), 'N $\n')
+
+    def testBinary(self):
+        """
+        Test saving and loading mazes in the binary format.
+        """
+        text_file = os.path.join('output', 'test_maze_binary.txt')
+        binary_file = os.path.join('output', 'test_maze.mzb')
+
+        m = Maze.Maze()
+        m.setDraw(False)
+        for width, height in [ (1, 1), (7, 5), (8, 3) ]:
+            m.random(width, height, 3)
+            walls = m._grid.walls
+            start, finish = m.getStart(), m.getFinish()
+            m.save(binary_file, binary=True)
+            self.assertEqual(os.path.getsize(binary_file),
+                             32 + (width * height + 1) // 2)
+
+            m.load(binary_file)
+            self.assertEqual(m._grid.cells(0, width * height), walls)
+            self.assertEqual((m.getStart(), m.getFinish()), (start, finish))
+
+        # A binary maze behaves like any other, and can be saved back
+        # to text
+        m.load('test_maze.txt')
+        walls = m._grid.walls
+        m.save(binary_file, binary=True)
+        m.load(binary_file)
+        m.turnRight()
+        self.assertTrue(m.moveForward())
+        self.assertEqual(m.getPosition(), (0, 1))
+        self.assertFalse(m.wasVisited())
+        m.turnRight()
+        self.assertFalse(m.pathIsClear())
+        m.save(text_file)
+        m.load(text_file)
+        self.assertEqual(m._grid.walls, walls)
+        self.assertEqual(m.getStart(), (0, 0))
+        self.assertEqual(m.getFinish(), (5, 9))
+
+        # A header whose start or finish point is outside the maze is
+        # rejected when the file is opened
+        with open(binary_file, 'rb') as f:
+            data = bytearray(f.read())
+        corrupt_file = os.path.join('output', 'test_maze_corrupt.mzb')
+        for offset, value in [ (16, 11), (20, 10), (24, 0xffffffff),
+                               (28, 10) ]:
+            corrupt = bytearray(data)
+            struct.pack_into('<I', corrupt, offset, value)
+            with open(corrupt_file, 'wb') as f:
+                f.write(corrupt)
+            self.assertRaises(ValueError, MazeBinary.load, corrupt_file)
+            self.assertRaises(ValueError, MazeBinary.loadPaged, corrupt_file)
+
+    def testPaged(self):
+        """
+        Test opening binary mazes in paged mode.
+        """
+        binary_file = os.path.join('output', 'test_maze_paged.mzb')
+        m = Maze.Maze()
+        m.setDraw(False)
+        m.random(17, 11, 4)
+        walls = m._grid.walls
+        m.save(binary_file, binary=True)
+
+        # A paged grid reads the same cells, whatever the tile size
+        for tile_size, max_tiles in [ (1, 1), (3, 2), (4, 100), (64, 1) ]:
+            grid, start, finish = MazeBinary.loadPaged(binary_file,
+                                                       tile_size, max_tiles)
+            self.assertEqual((start, finish), (m.getStart(), m.getFinish()))
+            for row_no in range(11):
+                for col_no in range(17):
+                    self.assertEqual(grid.get(row_no, col_no),
+                                     walls[row_no * 17 + col_no])
+            self.assertLessEqual(len(grid._tiles), max_tiles)
+            self.assertEqual(grid.cells(0, len(grid)), walls)
+
+            # Changes are kept in memory, even when their tiles would
+            # otherwise have been dropped
+            grid.set(0, 0, 0)
+            grid.set(10, 16, 15)
+            for row_no in range(11):
+                for col_no in range(17):
+                    grid.get(row_no, col_no)
+            self.assertEqual(grid.get(0, 0), 0)
+            self.assertEqual(grid.get(10, 16), 15)
+            cells = grid.cells(0, len(grid))
+            self.assertEqual(cells[0], 0)
+            self.assertEqual(cells[-1], 15)
+            self.assertEqual(cells[1:-1], walls[1:-1])
+            self.assertEqual(grid.cells(5, 9), walls[5:9])
+            self.assertEqual(MazeBinary.loadPaged(binary_file)[0].cells(
+                0, len(grid)), walls)
+
+        # A paged maze walks like one that was loaded whole
+        paged = Maze.Maze()
+        paged.setDraw(False)
+        paged.load(binary_file, paged=True)
+        m.load(binary_file)
+        for i in range(200):
+            self.assertEqual(paged.pathIsClear(), m.pathIsClear())
+            self.assertEqual(paged.wasVisited(), m.wasVisited())
+            if i % 3:
+                self.assertEqual(paged.moveForward(), m.moveForward())
+            else:
+                paged.turnRight()
+                m.turnRight()
+            self.assertEqual(paged.getPosition(), m.getPosition())
+            self.assertEqual(paged.getVisitCount(), m.getVisitCount())
+        self.assertLess(len(paged.getVisitCounts()), 17 * 11)
+
+        with self.assertRaises(ValueError):
+            paged.load('test_maze.txt', paged=True)
+
+        # The file is closed when the grid is replaced, or at the end
+        # of a with statement
+        f = paged._grid._file
+        paged.load(binary_file, paged=True)
+        self.assertTrue(f.closed)
+        f = paged._grid._file
+        paged.random(5, 5, 1)
+        self.assertTrue(f.closed)
+        with MazeBinary.loadPaged(binary_file)[0] as grid:
+            self.assertEqual(grid.cells(0, len(grid)), walls)
+        self.assertTrue(grid._file.closed)
+
+    def testRandomToFile(self):
+        """
+        Test generating random mazes straight to a binary file.
+        """
+        binary_file = os.path.join('output', 'test_maze_generated.mzb')
+        g = MazeGenerator.MazeGenerator()
+        for width, height in [ (1, 1), (1, 8), (8, 1), (23, 17) ]:
+            grid, start, finish = g.random(width, height, 6)
+            self.assertEqual(g.randomToFile(binary_file, width, height, 6),
+                             (start, finish))
+            self.assertEqual(g.grid, None)
+            loaded = MazeBinary.load(binary_file)
+            self.assertEqual(loaded[0].cells(0, width * height), grid.walls)
+            self.assertEqual(loaded[1:], (start, finish))
+
+    def testPickle(self):
+        """
+        Test pickling mazes, with and without shared memory.
+        """
+        m = Maze.Maze()
+        m.setDraw(False)
+        self.assertEqual(pickle.loads(pickle.dumps(m, 2)).getPosition(),
+                         (0, 0))
+
+        m.load('test_maze.txt')
+        m.turnRight()
+        m.moveForward()
+        m.moveForward()
+        for shared in [ False, True ]:
+            if shared:
+                filename = m.share()
+            copy = pickle.loads(pickle.dumps(m, 2))
+            self.assertEqual(copy._grid.cells(0, 110),
+                             m._grid.cells(0, 110))
+            self.assertEqual(copy.getPosition(), (0, 2))
+            self.assertEqual(copy.getOrientation(), 'E')
+            self.assertEqual(copy.getStart(), m.getStart())
+            self.assertEqual(copy.getFinish(), m.getFinish())
+            self.assertEqual(list(copy.getVisitCounts()),
+                             list(m.getVisitCounts()))
+            self.assertFalse(copy.wasVisited())
+            self.assertTrue(copy.moveForward())
+            self.assertEqual(copy.getPosition(), (0, 3))
+            self.assertEqual(m.getPosition(), (0, 2))
+
+        # Copies keep working after the shared file is removed, and
+        # a shared maze still saves the way it was loaded
+        data = pickle.dumps(m, 2)
+        copy = pickle.loads(data)
+        m.unshare()
+        self.assertFalse(os.path.exists(filename))
+        self.assertRaises(IOError, pickle.loads, data)
+        self.assertTrue(copy.moveForward())
+        output_file = os.path.join('output', 'test_maze_pickled.txt')
+        copy.save(output_file)
+        self.assertTrue(filecmp.cmp('test_maze.txt', output_file))
+
+        # The file goes with the maze that shared it
+        copy = Maze.Maze()
+        copy.setDraw(False)
+        copy.load('test_maze.txt')
+        filename = copy.share()
+        del copy
+        self.assertFalse(os.path.exists(filename))
+
+        binary_file = os.path.join('output', 'test_maze_pickled.mzb')
+        m.save(binary_file, binary=True)
+        m.load(binary_file, paged=True)
+        m.turnRight()
+        m.moveForward()
+        data = pickle.dumps(m, 2)
+        copy = pickle.loads(data)
+        self.assertEqual(copy.getVisitCounts(), m.getVisitCounts())
+        self.assertEqual(copy._grid.cells(0, 110), m._grid.cells(0, 110))
+
+        # The file is found from any working directory
+        directory = os.getcwd()
+        os.chdir('output')
+        try:
+            copy = pickle.loads(data)
+        finally:
+            os.chdir(directory)
+        self.assertEqual(copy._grid.cells(0, 110), m._grid.cells(0, 110))
+
+    def checkPath(self, grid, path, source, target):
+        """
+        A helper method to check that a path runs from source to
+        target through open passages.
+        """
+        self.assertEqual(path[0], source)
+        self.assertEqual(path[-1], target)
+        for cell, next_cell in zip(path[:-1], path[1:]):
+            row, col = grid.position(cell)
+            direction = [ d for d in grid.directions
+                          if grid.index(row + grid.offsets[d][0],
+                                        col + grid.offsets[d][1]) ==
+                          next_cell ][0]
+            self.assertTrue(grid.isOpen(row, col, direction))
+
+    def testSolver(self):
+        """
+        Test the shortest-path searches.
+        """
+        m = Maze.Maze()
+        m.setDraw(False)
+        m.load('test_maze.txt')
+        for method in [ 'bfs', 'bidirectional', 'astar' ]:
+            path = m.solve(method)
+            self.checkPath(m._grid, path, 0, 59)
+            self.assertEqual(len(path), 39)
+        self.assertRaises(ValueError, m.solve, 'dfs')
+
+        # A grid with loops, where many paths are possible
+        grid = MazeGrid.MazeGrid(7, 5)
+        for row in range(5):
+            for col in range(7):
+                if col < 6:
+                    grid.carve(row, col, 'E')
+                if row < 4:
+                    grid.carve(row, col, 'S')
+        grid.carve(2, 2, 'N')
+        solver = MazeSolver.MazeSolver(grid)
+        self.assertEqual(list(solver.neighbors[solver.offsets[8]:
+                                               solver.offsets[9]]),
+                         [ 1, 9, 15, 7 ])
+        for source, target in [ (0, 34), (30, 4), (16, 16), (6, 28) ]:
+            row, col = grid.position(source)
+            target_row, target_col = grid.position(target)
+            for method in [ solver.bfs, solver.bidirectional,
+                            solver.astar ]:
+                path = method(source, target)
+                self.checkPath(grid, path, source, target)
+                self.assertEqual(len(path), abs(row - target_row) +
+                                 abs(col - target_col) + 1)
+
+        # Unreachable cells
+        grid = MazeGrid.MazeGrid(3, 1)
+        grid.carve(0, 0, 'E')
+        solver = MazeSolver.MazeSolver(grid)
+        for method in [ solver.bfs, solver.bidirectional, solver.astar ]:
+            self.assertEqual(method(0, 2), None)
+            self.assertEqual(list(method(1, 0)), [ 1, 0 ])
+
+        # Perfect mazes have only one path
+        g = MazeGenerator.MazeGenerator()
+        grid, start, finish = g.random(40, 30, 2)
+        solver = MazeSolver.MazeSolver(grid)
+        source = grid.index(*start)
+        target = grid.index(*finish)
+        path = solver.bfs(source, target)
+        self.checkPath(grid, path, source, target)
+        self.assertEqual(solver.bidirectional(source, target), path)
+        self.assertEqual(solver.astar(source, target), path)
+
+        # Sides open on the edge of the maze, or on only one of their
+        # cells, are not passages
+        m = Maze.Maze()
+        m.setDraw(False)
+        m._load(StringIO.StringIO('E^ WE WSE\nE$ WE NW\n'))
+        for method in [ 'bfs', 'bidirectional', 'astar' ]:
+            self.assertEqual(list(m.solve(method)), [ 0, 1, 2, 5, 4, 3 ])
+        grid = MazeGrid.MazeGrid(3, 1)
+        grid.carve(0, 0, 'E')
+        grid.set(0, 1, grid.get(0, 1) | MazeGrid.MazeGrid.E)
+        solver = MazeSolver.MazeSolver(grid)
+        for method in [ solver.bfs, solver.bidirectional, solver.astar ]:
+            self.assertEqual(method(0, 2), None)
+            self.assertEqual(method(2, 0), None)
+            self.assertEqual(list(method(1, 0)), [ 1, 0 ])
+
+    def testDistances(self):
+        """
+        Test the cached distance-to-finish field.
+        """
+        m = Maze.Maze()
+        m.setDraw(False)
+        m.load('test_maze.txt')
+        distances = m.getDistances()
+        self.assertEqual(distances[59], 0)
+        self.assertEqual(m.getStepsRemaining(), 38)
+        m.turnRight()
+        m.moveForward()
+        self.assertEqual(m.getStepsRemaining(), 37)
+        self.assertTrue(m.getDistances() is distances)
+        with self.assertRaises(ValueError):
+            distances[0] = 0
+
+        # Every reachable cell agrees with a search from that cell
+        solver = m.getSolver()
+        for cell in range(100):
+            path = solver.bfs(cell, 59)
+            self.assertEqual(distances[cell],
+                             len(path) - 1 if path else -1)
+
+        # Large frontiers are expanded with NumPy, and give the same
+        # distances as small ones
+        grid = MazeGrid.MazeGrid(300, 200)
+        for row in range(200):
+            for col in range(300):
+                if col < 299:
+                    grid.carve(row, col, 'E')
+                if row < 199:
+                    grid.carve(row, col, 'S')
+        solver = MazeSolver.MazeSolver(grid)
+        target = grid.index(120, 170)
+        distances = solver.distances(target)
+        for cell in range(0, len(grid), 97):
+            row, col = grid.position(cell)
+            self.assertEqual(distances[cell], abs(row - 120) + abs(col - 170))
+
+        # The field is recomputed when the maze changes
+        m.random(20, 15, 3)
+        distances = m.getDistances()
+        self.assertEqual(m.getStepsRemaining(), len(m.solve()) - 1)
+        self.assertEqual(distances[m._grid.index(*m.getFinish())], 0)
+        self.assertEqual(distances.min(), 0)
+
+    def testJunctions(self):
+        """
+        Test the corridor-contracted junction graph.
+        """
+        m = Maze.Maze()
+        m.setDraw(False)
+        m.load('test_maze.txt')
+        self.assertEqual(m.nextJunction(), None)
+        m.turnRight()
+        self.assertEqual(m.nextJunction(), ((0, 2), 2))
+        junctions = m.getJunctions()
+        self.assertTrue(m.getJunctions() is junctions)
+        self.assertTrue(junctions.isNode(2))
+        self.assertFalse(junctions.isNode(1))
+
+        # Every corridor is an edge in each direction, and its cells
+        # lead from one end to the other
+        grid = m._grid
+        for e in range(len(junctions.edge_target)):
+            cells = junctions.edgeCells(e)
+            self.assertEqual(len(cells), junctions.edge_length[e] + 1)
+            self.assertEqual(cells[-1], junctions.node_cells[
+                    junctions.edge_target[e]])
+            self.checkPath(grid, cells, cells[0], cells[-1])
+            self.assertFalse(any(junctions.isNode(cell)
+                                 for cell in cells[1:-1]))
+
+        # Paths through the graph are as short as those found on the
+        # grid, including in grids with loops
+        ring = MazeGrid.MazeGrid(4, 3)
+        for col in range(3):
+            ring.carve(0, col, 'E')
+            ring.carve(2, col, 'E')
+        for row in range(2):
+            ring.carve(row, 0, 'S')
+            ring.carve(row, 3, 'S')
+        g = MazeGenerator.MazeGenerator()
+        for grid in [ grid, ring, g.kruskal(15, 10, 1)[0],
+                      g.division(15, 10, 1)[0] ]:
+            junctions = MazeJunctions.JunctionGraph(grid)
+            solver = MazeSolver.MazeSolver(grid)
+            for source in range(0, len(grid), 7):
+                for target in range(0, len(grid), 5):
+                    path = junctions.path(source, target)
+                    expected = solver.bfs(source, target)
+                    if expected is None:
+                        self.assertEqual(path, None)
+                    else:
+                        self.checkPath(grid, path, source, target)
+                        self.assertEqual(len(path), len(expected))
+
+        # The graph is rebuilt when the maze changes
+        m.random(20, 15, 3)
+        self.assertFalse(m.getJunctions() is junctions)
+        self.assertLess(len(m.getJunctions()), 20 * 15)
+
+        # Corridors cannot be followed through one-sided walls
+        lopsided = MazeGrid.MazeGrid(3, 1)
+        lopsided.carve(0, 0, 'E')
+        lopsided.set(0, 1, lopsided.get(0, 1) | MazeGrid.MazeGrid.E)
+        self.assertRaises(ValueError, MazeJunctions.JunctionGraph, lopsided)
+        lopsided = MazeGrid.MazeGrid(3, 1)
+        lopsided.set(0, 2, MazeGrid.MazeGrid.E)
+        self.assertRaises(ValueError, MazeJunctions.JunctionGraph, lopsided)
+
+    def testHierarchy(self):
+        """
+        Test hierarchical pathfinding, and the hint that uses it.
+        """
+        g = MazeGenerator.MazeGenerator()
+        ring = MazeGrid.MazeGrid(9, 2)
+        for col in range(8):
+            ring.carve(0, col, 'E')
+            ring.carve(1, col, 'E')
+        ring.carve(0, 0, 'S')
+        ring.carve(0, 8, 'S')
+        for grid in [ ring, g.random(23, 17, 1)[0], g.kruskal(23, 17, 1)[0] ]:
+            solver = MazeSolver.MazeSolver(grid)
+            for cluster_size in [ 1, 5, 100 ]:
+                hierarchy = MazeHierarchy.HierarchicalPathfinder(grid,
+                                                                 cluster_size)
+                for source in range(0, len(grid), 23):
+                    for target in range(0, len(grid), 31):
+                        path = hierarchy.path(source, target)
+                        expected = solver.bfs(source, target)
+                        self.checkPath(grid, path, source, target)
+                        self.assertEqual(len(path), len(expected))
+                        step = hierarchy.firstStep(source, target)
+                        if source == target:
+                            self.assertEqual(step, None)
+                        else:
+                            self.assertEqual(len(solver.bfs(step, target)),
+                                             len(expected) - 1)
+
+        # The abstract graph is saved next to the maze, and used again
+        # while the maze file is unchanged
+        maze_file = os.path.join('output', 'test_maze_hint.txt')
+        shutil.copy('test_maze.txt', maze_file)
+        m = Maze.Maze()
+        m.setDraw(False)
+        m.load(maze_file)
+        self.assertEqual(m.hint(), 'E')
+        m.turnRight()
+        m.moveForward()
+        self.assertEqual(m.hint(), 'E')
+        self.assertTrue(os.path.exists(maze_file + '.hpa'))
+        saved = MazeHierarchy.load(maze_file + '.hpa', m._grid, maze_file)
+        hierarchy = m.getHierarchy()
+        self.assertEqual(saved.node_cells, hierarchy.node_cells)
+        self.assertEqual(saved.edge_length, hierarchy.edge_length)
+        m._position = m.getFinish()
+        self.assertEqual(m.hint(), None)
+
+        with open(maze_file, 'a') as f:
+            f.write('\n')
+        self.assertEqual(MazeHierarchy.load(maze_file + '.hpa', m._grid,
+                                            maze_file), None)
+
+    def testWalls(self):
+        """
+        Test opening and closing walls, and the repair of the distance
+        field as they change.
+        """
+        m = Maze.Maze()
+        m.setDraw(False)
+        m.random(15, 11, 3)
+        grid = m._grid
+        self.assertRaises(ValueError, m.setWall, 0, 4, 'N', False)
+        self.assertRaises(ValueError, m.setWall, 10, 14, 'E', False)
+        self.assertRaises(ValueError, m.setWall, 3, 4, 'X', False)
+        self.assertRaises(ValueError, m.toggleWall, 3, 4, 'X')
+
+        # Both sides of the wall change together
+        closed = m.toggleWall(5, 7, 'S')
+        self.assertEqual(grid.isOpen(5, 7, 'S'), not closed)
+        self.assertEqual(grid.isOpen(6, 7, 'N'), not closed)
+        self.assertEqual(m.toggleWall(6, 7, 'N'), not closed)
+        self.assertEqual(grid.isOpen(5, 7, 'S'), closed)
+
+        # The repaired field always matches one computed from scratch,
+        # including as parts of the maze are cut off and joined again
+        distances = m.getDistances()
+        finish = grid.index(*m.getFinish())
+        rng = random.Random(7)
+        for i in range(600):
+            if i == 300:
+                # Large changes are recomputed instead
+                m._repair_minimum = 0
+            row = rng.randrange(grid.height)
+            col = rng.randrange(grid.width - 1)
+            direction = 'E'
+            if rng.random() < 0.5:
+                row, col = col % (grid.height - 1), row
+                direction = 'S'
+            m.toggleWall(row, col, direction)
+            self.assertTrue(m.getDistances() is distances)
+            expected = MazeSolver.MazeSolver(grid).distances(finish)
+            self.assertEqual(list(distances), list(expected))
+        self.assertFalse(distances.flags.writeable)
+
+        # The hint follows the repaired field, from the cell furthest
+        # from the end point
+        furthest = max(range(len(grid)), key=lambda cell: distances[cell])
+        m._position = grid.position(furthest)
+        steps = m.getStepsRemaining()
+        self.assertGreater(steps, 1)
+        self.assertEqual(len(m.solve()), steps + 1)
+        for i in range(steps):
+            direction = m.hint()
+            d_row, d_col = MazeGrid.MazeGrid.offsets[direction]
+            row, col = m.getPosition()
+            self.assertTrue(grid.isOpen(row, col, direction))
+            m._position = (row + d_row, col + d_col)
+            self.assertEqual(m.getStepsRemaining(), steps - i - 1)
+        self.assertEqual(m.getPosition(), m.getFinish())
+        self.assertEqual(m.hint(), None)
+
+        # Sides open on the edge of the maze, or on only one of their
+        # cells, are not passages, before or after an edit
+        m = Maze.Maze()
+        m.setDraw(False)
+        m._load(StringIO.StringIO('E^ WE WSE\nE$ WE NW\n'))
+        self.assertEqual(list(m.getDistances()), [ 5, 4, 3, 0, 1, 2 ])
+        m._grid.set(0, 0, m._grid.get(0, 0) | MazeGrid.MazeGrid.S)
+        m.setWall(0, 1, 'S', False)
+        self.assertEqual(list(m.getDistances()), [ 3, 2, 3, 0, 1, 2 ])
+        m.setWall(0, 1, 'S', True)
+        self.assertEqual(list(m.getDistances()), [ 5, 4, 3, 0, 1, 2 ])
+
+        # Packed grids are edited the same way
+        packed = MazeGrid.PackedGrid(3, 3, bytearray(9))
+        packed.carve(1, 1, 'W')
+        packed.close(1, 0, 'E')
+        self.assertFalse(packed.isOpen(1, 1, 'W'))
+        self.assertFalse(packed.isOpen(1, 0, 'E'))
+
+    def testArchive(self):
+        """
+        Test encoding and decoding mazes in the archive format.
+        """
+        g = MazeGenerator.MazeGenerator()
+        for width, height in [ (1, 1), (1, 9), (9, 1), (13, 10) ]:
+            grid, start, finish = g.random(width, height, 5)
+            data = MazeArchive.encode(grid, start, finish, rows_per_chunk=3)
+            decoded, d_start, d_finish = MazeArchive.decode(data)
+            self.assertEqual(decoded.walls, grid.walls)
+            self.assertEqual((d_start, d_finish), (start, finish))
+
+            # Any band of rows can be decoded on its own
+            for first_row in range(height):
+                for last_row in range(first_row, height + 1):
+                    band = MazeArchive.decodeRows(data, first_row, last_row)
+                    self.assertEqual(band.height, last_row - first_row)
+                    self.assertEqual(band.walls,
+                                     grid.cells(first_row * width,
+                                                last_row * width))
+
+        # A large perfect maze takes no more than two bits per cell
+        grid, start, finish = g.random(200, 200, 1)
+        data = MazeArchive.encode(grid, start, finish)
+        self.assertLessEqual(len(data) * 8, 2 * len(grid) + 8 * 64)
+
+        self.assertRaises(ValueError, MazeArchive.decode, b'MAZB' + data[4:])
+        self.assertRaises(ValueError, MazeArchive.decodeRows, data, 5, 201)
+
     def testSpiral(self):
         """
         Test the spiral maze generation.
@@ -252,6 +847,226 @@ class MazeTest(unittest.TestCase):
         self.assertEqual(m.getStart(), (0, 0))
         self.assertEqual(m.getFinish(), (2, 1))
 
+    def testVectorized(self):
+        """
+        Test the NumPy-based maze generators.
+        """
+        m = Maze.Maze()
+        m.setDraw(False)
+
+        for generate in [ m.binaryTree, m.sidewinder ]:
+            generate(12, 8, 0)
+            walls = m._grid.walls
+            start, finish = m.getStart(), m.getFinish()
+            self.assertEqual(start[1], 0)
+            self.assertEqual(finish[1], 11)
+            self.assertEqual(m.getPosition(), start)
+
+            # A perfect maze has exactly one fewer passage than cells
+            n_open = sum(bin(c).count('1') for c in walls)
+            self.assertEqual(n_open, 2 * (12 * 8 - 1))
+
+            generate(12, 8, 0)
+            self.assertEqual(m._grid.walls, walls)
+            self.assertEqual((m.getStart(), m.getFinish()), (start, finish))
+
+    def testEller(self):
+        """
+        Test that a maze streamed row by row with Eller's algorithm
+        matches the same maze generated in memory.
+        """
+        output_maze = os.path.join('output', 'test_maze_eller.txt')
+        output_stream = os.path.join('output', 'test_maze_eller_rows.txt')
+
+        m = Maze.Maze()
+        m.setDraw(False)
+        m.eller(20, 15, 4)
+        m.save(output_maze)
+
+        rows, start, finish = m._generator.ellerRows(20, 15, 4)
+        with open(output_stream, 'w') as f:
+            MazeText.writeRows(f, rows, start, finish)
+        self.assertTrue(filecmp.cmp(output_maze, output_stream))
+
+        n_open = sum(bin(c).count('1') for c in m._grid.walls)
+        self.assertEqual(n_open, 2 * (20 * 15 - 1))
+
+    def testPerfect(self):
+        """
+        Test that the random maze generators produce perfect mazes
+        (every cell reachable, with exactly one path between any two
+        cells), and that they are repeatable for a given seed.
+        """
+        m = Maze.Maze()
+        m.setDraw(False)
+
+        tiled = lambda width, height, seed: m.tiled(width, height, seed,
+                                                    tile_size=4, processes=2)
+        for generate in [ m.random, m.eller, m.wilson, m.kruskal,
+                          m.division, tiled ]:
+            for width, height in [ (1, 1), (1, 6), (6, 1), (13, 9) ]:
+                generate(width, height, 2)
+                walls = m._grid.walls
+                start, finish = m.getStart(), m.getFinish()
+
+                # Count the passages, and the cells reachable from the
+                # start point
+                n_open = sum(bin(c).count('1') for c in walls)
+                self.assertEqual(n_open, 2 * (width * height - 1))
+                reached = set([start])
+                cells = [start]
+                while cells:
+                    row, col = cells.pop()
+                    for d, (d_row, d_col) in m._grid.offsets.items():
+                        cell = (row + d_row, col + d_col)
+                        if m._grid.isOpen(row, col, d) and\
+                                cell not in reached:
+                            reached.add(cell)
+                            cells.append(cell)
+                self.assertEqual(len(reached), width * height)
+                self.assertIn(finish, reached)
+
+                generate(width, height, 2)
+                self.assertEqual(m._grid.walls, walls)
+                self.assertEqual((m.getStart(), m.getFinish()),
+                                 (start, finish))
+
+        # Tiles are seeded from the maze seed and their position
+        # together, so no tile seed comes up twice
+        tile_seeds = set(MazeGenerator._tileSeed(seed, row, col)
+                         for seed in range(10) for row in range(4)
+                         for col in range(4))
+        self.assertEqual(len(tile_seeds), 10 * 4 * 4)
+
+    def testBatch(self):
+        """
+        Test generating many mazes at once, and that generating mazes
+        does not disturb the global random number generator.
+        """
+        generator = MazeGenerator.MazeGenerator()
+        seeds = [ 3, 1, 4, 1, 5 ]
+        walls, starts, finishes = generator.batch(8, 6, seeds, 'kruskal')
+        self.assertEqual(len(walls), 8 * 6 * len(seeds))
+        for i, seed in enumerate(seeds):
+            grid, start, finish = generator.kruskal(8, 6, seed)
+            self.assertEqual(walls[i * 48:(i + 1) * 48], grid.walls)
+            self.assertEqual(starts[i], start)
+            self.assertEqual(finishes[i], finish)
+
+        random.seed(9)
+        expected = random.random()
+        random.seed(9)
+        generator.random(10, 10, 0)
+        self.assertEqual(random.random(), expected)
+
+    def testCache(self):
+        """
+        Test the cache of generated mazes.
+        """
+        cache_dir = os.path.join('output', 'cache')
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        cache = MazeCache.MazeCache(size=2, directory=cache_dir)
+
+        m = Maze.Maze()
+        m.setDraw(False)
+        m.random(12, 9, 7)
+        walls, start, finish = m._grid.walls, m.getStart(), m.getFinish()
+
+        m.setCache(cache)
+        m.random(12, 9, 7)
+        m.spiral(5, 5)
+        m.random(12, 9, 7)
+        self.assertEqual((cache.hits, cache.disk_hits, cache.misses),
+                         (1, 0, 2))
+        self.assertEqual(m._grid.walls, walls)
+        self.assertEqual((m.getStart(), m.getFinish()), (start, finish))
+
+        # Push the random maze out of memory; it should then come back
+        # from disk
+        m.line(4)
+        m.line(5)
+        m.random(12, 9, 7)
+        self.assertEqual(cache.disk_hits, 1)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(m._grid.walls, walls)
+        self.assertEqual((m.getStart(), m.getFinish()), (start, finish))
+
+        # Unseeded mazes are never cached
+        m.random(12, 9)
+        self.assertEqual(cache.misses, 4)
+
+        # The number of worker processes does not change the maze, so
+        # it is not part of the key
+        cache.clear()
+        m.tiled(12, 9, 7, tile_size=4, processes=1)
+        tiled_walls = m._grid.walls
+        m.tiled(12, 9, 7, tile_size=4, processes=2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(m._grid.walls, tiled_walls)
+
+        # A damaged file on disk counts as a miss, and is replaced
+        path = cache._path(('random', 12, 9, 7))
+        for damage in [ lambda data: data[:10], lambda data: data[:-5],
+                        lambda data: data[:30] + b'x' * 20 ]:
+            with open(path, 'rb') as f:
+                data = f.read()
+            with open(path, 'wb') as f:
+                f.write(damage(data))
+            cache.clear()
+            m.random(12, 9, 7)
+            self.assertEqual((cache.disk_hits, cache.misses), (0, 1))
+            self.assertEqual(m._grid.walls, walls)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+
+    def testCarve(self):
+        """
+        Test that the carve events of each generator rebuild the maze
+        that the generator returns.
+        """
+        generator = MazeGenerator.MazeGenerator()
+        for algorithm, args in [ ('line', (7,)), ('spiral', (6, 5)),
+                                 ('random', (9, 7, 1)),
+                                 ('binaryTree', (9, 7, 1)),
+                                 ('sidewinder', (9, 7, 1)),
+                                 ('eller', (9, 7, 1)),
+                                 ('wilson', (9, 7, 1)),
+                                 ('kruskal', (9, 7, 1)),
+                                 ('division', (9, 7, 1)),
+                                 ('tiled', (9, 7, 1, 4, 1)) ]:
+            grid, start, finish = getattr(generator, algorithm)(*args)
+            rebuilt = MazeGrid.MazeGrid(grid.width, grid.height)
+            for cell, direction in generator.carve(algorithm, *args):
+                rebuilt.carve(cell // grid.width, cell % grid.width,
+                              direction)
+            self.assertEqual(rebuilt.walls, grid.walls)
+            self.assertEqual((generator.start, generator.finish),
+                             (start, finish))
+
+        # Generation can be stopped part of the way through
+        events = generator.carve('random', 9, 7, 1)
+        for i in range(10):
+            next(events)
+        n_open = sum(bin(c).count('1') for c in generator.grid.walls)
+        self.assertEqual(n_open, 2 * 10)
+
+        # Generators that work on many cells at once also stop early:
+        # the rows, regions or tiles not yet reached are left untouched
+        for algorithm, args in [ ('binaryTree', (9, 7, 1)),
+                                 ('sidewinder', (9, 7, 1)),
+                                 ('tiled', (9, 7, 1, 4, 1)) ]:
+            events = generator.carve(algorithm, *args)
+            next(events)
+            events.close()
+            self.assertEqual(generator.grid.walls[-9:], bytearray(9))
+        events = generator.carve('division', 9, 7, 1)
+        next(events)
+        events.close()
+        self.assertTrue(generator.grid.walls.count(
+            chr(MazeGrid.MazeGrid.N | MazeGrid.MazeGrid.E |
+                MazeGrid.MazeGrid.S | MazeGrid.MazeGrid.W)) > 0)
+
     def testTrail(self):
         m = Maze.Maze()
         m.load('test_maze.txt')